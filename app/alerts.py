@@ -0,0 +1,465 @@
+#!/usr/bin/env python3
+"""Streaming rule-based alerting.
+
+Rules are loaded from a JSON file and compiled once. Every snapshot is
+flattened into labelled series (`disk.percent{mountpoint="/"}`). Threshold
+rules indexed under the metric of a series are only evaluated when its value
+changed, rate rules run every tick against the previous sample, and pairs
+that are already pending or firing are re-checked each tick. Alerts go
+through pending -> firing -> resolved with a for-duration and a separate
+clear threshold (hysteresis), and each episode is notified once. A firing
+alert whose series stays missing for `missing_after` seconds is resolved; a
+shorter gap, such as one failed collection, leaves it as it was.
+
+Notifications are queued and delivered in batches from a background thread,
+with retries and exponential backoff, so a slow webhook never delays the
+collection tick.
+
+Example rules file:
+
+    [
+      {"name": "HighCPU", "metric": "cpu.usage", "type": "threshold",
+       "op": ">", "value": 90, "clear": 80, "for": 30},
+      {"name": "DiskFilling", "metric": "disk.percent",
+       "labels": {"mountpoint": "/var/*"}, "type": "rate", "op": ">", "value": 0.5},
+      {"name": "NoSamples", "metric": "cpu.usage", "type": "absent", "for": 60}
+    ]
+"""
+import json
+import time
+import queue
+import fnmatch
+import logging
+import operator
+import re
+import threading
+import urllib.request
+
+logger = logging.getLogger('system_monitor')
+
+OPERATORS = {
+    '>': operator.gt,
+    '>=': operator.ge,
+    '<': operator.lt,
+    '<=': operator.le,
+    '==': operator.eq,
+    '!=': operator.ne
+}
+
+RULE_TYPES = ('threshold', 'rate', 'absent')
+
+
+class RuleError(ValueError):
+    """Raised when a rule definition is invalid."""
+
+
+# Flatten a snapshot into {(metric, labels): value}
+def extract_series(snapshot):
+    series = {}
+
+    def put(metric, value, **labels):
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            series[(metric, tuple(sorted(labels.items())))] = float(value)
+
+    cpu = snapshot.get('cpu_info') or {}
+    put('cpu.usage', cpu.get('raw_total_usage'))
+    put('cpu.temperature', cpu.get('raw_temperature'))
+    for core, usage in enumerate(cpu.get('raw_usage_per_core') or []):
+        put('cpu.core_usage', usage, core=str(core))
+    burst = cpu.get('burst') or {}
+    put('cpu.usage_p95', (burst.get('usage') or {}).get('p95'))
+
+    memory = snapshot.get('memory_info') or {}
+    put('memory.percent', (memory.get('raw_values') or {}).get('percent'))
+    put('swap.percent', (memory.get('raw_swap') or {}).get('percent'))
+
+    disk = snapshot.get('disk_info') or {}
+    for partition in disk.get('partitions') or []:
+        put('disk.percent', (partition.get('raw_values') or {}).get('percent'),
+            mountpoint=partition.get('mountpoint', ''), device=partition.get('device', ''))
+    rates = disk.get('io_rates') or {}
+    put('disk.read_rate', rates.get('disk_read_rate'))
+    put('disk.write_rate', rates.get('disk_write_rate'))
+
+    network = snapshot.get('network_info') or {}
+    rates = network.get('io_rates') or {}
+    put('net.upload_rate', rates.get('net_upload_rate'))
+    put('net.download_rate', rates.get('net_download_rate'))
+    for interface in network.get('interfaces') or []:
+        put('net.interface_up', 1 if interface.get('isup') == 'Up' else 0, interface=interface.get('name', ''))
+
+    for container in (snapshot.get('cgroup_info') or {}).get('containers') or []:
+        labels = {'container': container.get('id', ''), 'runtime': container.get('runtime', '')}
+        put('container.cpu_percent', container.get('cpu_percent'), **labels)
+        put('container.memory_percent', container.get('memory_percent'), **labels)
+        put('container.pids', container.get('pids'), **labels)
+
+    return series
+
+
+class Rule:
+    """A compiled alert rule."""
+
+    def __init__(self, definition):
+        try:
+            self.name = definition['name']
+            self.metric = definition['metric']
+        except KeyError as e:
+            raise RuleError(f"Rule is missing required field {e}")
+        self.type = definition.get('type', 'threshold')
+        if self.type not in RULE_TYPES:
+            raise RuleError(f"Rule {self.name}: unknown type '{self.type}'")
+        self.for_seconds = float(definition.get('for', 0))
+        self.severity = definition.get('severity', 'warning')
+        self.summary = definition.get('summary', '')
+        self.label_matchers = tuple(
+            (key, re.compile(fnmatch.translate(str(pattern))))
+            for key, pattern in (definition.get('labels') or {}).items()
+        )
+        self._match_cache = {}
+
+        if self.type == 'absent':
+            # Absence rules fire when a series has not been seen for `for` seconds
+            self.for_seconds = float(definition.get('for', 60))
+            return
+
+        op = definition.get('op', '>')
+        if op not in OPERATORS:
+            raise RuleError(f"Rule {self.name}: unknown operator '{op}'")
+        self.op = OPERATORS[op]
+        try:
+            self.value = float(definition['value'])
+        except (KeyError, TypeError, ValueError):
+            raise RuleError(f"Rule {self.name}: 'value' must be a number")
+        # Hysteresis: once firing, the alert only resolves past the clear level
+        self.clear = float(definition.get('clear', self.value))
+        self.clear_op = {'>': operator.le, '>=': operator.lt, '<': operator.ge, '<=': operator.gt}.get(op)
+
+    def matches(self, labels):
+        """Label matching is cached per label set, so it runs once per series."""
+        matched = self._match_cache.get(labels)
+        if matched is None:
+            label_map = dict(labels)
+            matched = all(key in label_map and pattern.match(label_map[key])
+                          for key, pattern in self.label_matchers)
+            self._match_cache[labels] = matched
+        return matched
+
+    def triggered(self, value):
+        return self.op(value, self.value)
+
+    def cleared(self, value):
+        if self.clear_op is None:
+            return not self.op(value, self.value)
+        return self.clear_op(value, self.clear)
+
+
+class AlertState:
+    """Lifecycle of one (rule, series) pair."""
+
+    __slots__ = ('status', 'since', 'value')
+
+    def __init__(self):
+        self.status = 'inactive'
+        self.since = None
+        self.value = None
+
+
+class AlertEngine:
+    """Evaluates compiled rules incrementally against each new snapshot."""
+
+    def __init__(self, rules, notifier=None, stale_after=3600, missing_after=10):
+        self.stale_after = stale_after
+        self.missing_after = missing_after
+        self.rules = [rule if isinstance(rule, Rule) else Rule(rule) for rule in rules]
+        self.notifier = notifier
+        self._rules_by_metric = {}
+        for rule in self.rules:
+            self._rules_by_metric.setdefault(rule.metric, []).append(rule)
+        self._absent_rules = [rule for rule in self.rules if rule.type == 'absent']
+        self._absent_targets = {rule: set() for rule in self._absent_rules}
+        self._last_prune = time.time()
+        self._values = {}
+        self._seen = {}
+        self._states = {}
+        self._active = set()
+        self.stats = {'evaluations': 0, 'last_eval_ms': 0.0}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_file(cls, path, notifier=None):
+        with open(path) as f:
+            definitions = json.load(f)
+        if isinstance(definitions, dict):
+            definitions = definitions.get('rules', [])
+        return cls(definitions, notifier)
+
+    def _transition(self, rule, key, state, condition, value, now, events):
+        state.value = value
+        if state.status == 'firing':
+            if not condition:
+                state.status = 'inactive'
+                state.since = None
+                self._active.discard((rule, key))
+                events.append(self._event(rule, key, 'resolved', value, now))
+        elif condition:
+            if state.status == 'inactive':
+                state.status = 'pending'
+                state.since = now
+                self._active.add((rule, key))
+            if now - state.since >= rule.for_seconds:
+                state.status = 'firing'
+                state.since = now
+                events.append(self._event(rule, key, 'firing', value, now))
+        elif state.status == 'pending':
+            state.status = 'inactive'
+            state.since = None
+            self._active.discard((rule, key))
+
+    def _condition(self, rule, state, value, rate):
+        """True while the alert should be (or stay) active."""
+        observed = rate if rule.type == 'rate' else value
+        if observed is None:
+            return state.status != 'inactive'
+        if state.status == 'firing':
+            return not rule.cleared(observed)
+        return rule.triggered(observed)
+
+    def evaluate(self, snapshot, now=None):
+        """Evaluate a snapshot; returns the notification events it produced."""
+        started = time.perf_counter()
+        now = time.time() if now is None else now
+        series = extract_series(snapshot)
+        with self._lock:
+            events = self._evaluate(series, now)
+        self.stats['last_eval_ms'] = round((time.perf_counter() - started) * 1000, 3)
+        if events and self.notifier:
+            self.notifier.notify(events)
+        return events
+
+    def _evaluate(self, series, now):
+        events = []
+        evaluations = 0
+        changed = set()
+
+        for key, value in series.items():
+            previous = self._values.get(key)
+            self._values[key] = (now, value)
+            self._seen[key] = now
+            metric, labels = key
+            for rule in self._rules_by_metric.get(metric, ()):
+                if not rule.matches(labels):
+                    continue
+                if rule.type == 'absent':
+                    self._absent_targets[rule].add(key)
+                    continue
+                rate = None
+                if rule.type == 'rate':
+                    # Rates move even when the value stalls, so these run every tick
+                    # against the previous sample
+                    if previous is None or now <= previous[0]:
+                        continue
+                    rate = (value - previous[1]) / (now - previous[0])
+                elif previous is not None and previous[1] == value:
+                    # Only a changed value can change the outcome of a threshold rule
+                    continue
+                state_key = (rule, key)
+                state = self._states.get(state_key)
+                if state is None:
+                    state = self._states[state_key] = AlertState()
+                self._transition(rule, key, state, self._condition(rule, state, value, rate), value, now, events)
+                changed.add(state_key)
+                evaluations += 1
+
+        # Pending and firing pairs advance with time even when values are flat
+        for state_key in list(self._active):
+            rule, key = state_key
+            if rule.type == 'absent' or state_key in changed:
+                # Absence is handled below; the rest were evaluated above
+                continue
+            state = self._states[state_key]
+            value = series.get(key)
+            if value is None:
+                # The series is gone (partition unmounted, container exited); a
+                # single failed collection is not enough to resolve the alert
+                if now - self._seen[key] >= self.missing_after:
+                    self._retire(state_key, now, events)
+                continue
+            self._transition(rule, key, state, self._condition(rule, state, value, None), value, now, events)
+            evaluations += 1
+
+        for rule, targets in self._absent_targets.items():
+            for key in targets:
+                last_seen = self._seen[key]
+                state_key = (rule, key)
+                state = self._states.get(state_key)
+                if state is None:
+                    state = self._states[state_key] = AlertState()
+                missing = now - last_seen >= rule.for_seconds
+                if missing and state.status != 'firing':
+                    state.status = 'firing'
+                    state.since = now
+                    self._active.add(state_key)
+                    events.append(self._event(rule, key, 'firing', None, now))
+                elif not missing and state.status == 'firing':
+                    state.status = 'inactive'
+                    self._active.discard(state_key)
+                    events.append(self._event(rule, key, 'resolved', None, now))
+                evaluations += 1
+
+        if now - self._last_prune >= 60:
+            self._prune(now, events)
+
+        self.stats['evaluations'] += evaluations
+        return events
+
+    def _retire(self, state_key, now, events):
+        """Drop a pair, resolving it first if it was firing."""
+        # Forget the last value so the series is evaluated again when it returns
+        self._values.pop(state_key[1], None)
+        state = self._states.get(state_key)
+        if state is not None and state.status == 'firing':
+            rule, key = state_key
+            events.append(self._event(rule, key, 'resolved', None, now))
+        if state is not None:
+            state.status = 'inactive'
+            state.since = None
+        self._active.discard(state_key)
+
+    def _prune(self, now, events):
+        """Forget series not seen for stale_after seconds (e.g. removed containers).
+
+        Series watched by absence rules are kept: being missing is exactly
+        what those alerts report, so they must not be resolved by pruning.
+        """
+        watched = set().union(*self._absent_targets.values())
+        stale = {key for key, last_seen in self._seen.items()
+                 if now - last_seen >= self.stale_after and key not in watched}
+        if stale:
+            for key in stale:
+                del self._seen[key]
+                self._values.pop(key, None)
+            for state_key in [state_key for state_key in self._states if state_key[1] in stale]:
+                self._retire(state_key, now, events)
+                del self._states[state_key]
+            # Label sets of removed series (one per container ID) would otherwise pile up
+            stale_labels = {labels for _, labels in stale}
+            for rule in self.rules:
+                for labels in stale_labels:
+                    rule._match_cache.pop(labels, None)
+        self._last_prune = now
+
+    def _event(self, rule, key, status, value, now):
+        metric, labels = key
+        return {
+            'fingerprint': f"{rule.name}:{metric}:{','.join(f'{k}={v}' for k, v in labels)}",
+            'rule': rule.name,
+            'status': status,
+            'severity': rule.severity,
+            'summary': rule.summary,
+            'metric': metric,
+            'labels': dict(labels),
+            'value': value,
+            'timestamp': now
+        }
+
+    def active_alerts(self):
+        """Currently firing alerts."""
+        alerts = []
+        with self._lock:
+            for rule, key in self._active:
+                state = self._states[(rule, key)]
+                if state.status == 'firing':
+                    alerts.append(self._event(rule, key, 'firing', state.value, state.since))
+        alerts.sort(key=lambda x: x['timestamp'])
+        return {'alerts': alerts, 'rules': len(self.rules), 'stats': dict(self.stats)}
+
+
+class WebhookNotifier:
+    """Delivers alert events to webhooks in batches with retry and backoff."""
+
+    def __init__(self, urls, batch_interval=5, max_batch=100, max_retries=5,
+                 backoff_base=1.0, backoff_max=60.0, timeout=5, max_queue=10000):
+        self.urls = list(urls)
+        self.batch_interval = batch_interval
+        self.max_batch = max_batch
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.timeout = timeout
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._stop = threading.Event()
+        self._thread = None
+        self.stats = {'sent': 0, 'failed': 0, 'dropped': 0}
+
+    def notify(self, events):
+        for event in events:
+            try:
+                self._queue.put_nowait(event)
+            except queue.Full:
+                self.stats['dropped'] += 1
+
+    def _next_batch(self):
+        """Block until the first event, then collect for up to batch_interval."""
+        try:
+            first = self._queue.get(timeout=1)
+        except queue.Empty:
+            return []
+        batch = {(first['fingerprint'], first['status']): first}
+        deadline = time.monotonic() + self.batch_interval
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                event = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            # De-duplicate repeated transitions within a batch, keeping order
+            key = (event['fingerprint'], event['status'])
+            batch.pop(key, None)
+            batch[key] = event
+        return list(batch.values())
+
+    def _post(self, url, body):
+        req = urllib.request.Request(url, data=body, headers={'Content-Type': 'application/json'}, method='POST')
+        with urllib.request.urlopen(req, timeout=self.timeout) as response:
+            return response.status
+
+    def deliver(self, url, batch):
+        """POST one batch, retrying with exponential backoff. Returns True on success."""
+        body = json.dumps({'alerts': batch}).encode('utf-8')
+        for attempt in range(self.max_retries + 1):
+            try:
+                self._post(url, body)
+                self.stats['sent'] += len(batch)
+                return True
+            except Exception as e:
+                if attempt == self.max_retries:
+                    logger.error(f"Giving up delivering {len(batch)} alerts to {url}: {str(e)}")
+                    break
+                delay = min(self.backoff_max, self.backoff_base * (2 ** attempt))
+                logger.warning(f"Alert delivery to {url} failed ({str(e)}), retrying in {delay:.1f}s")
+                if self._stop.wait(delay):
+                    break
+        self.stats['failed'] += len(batch)
+        return False
+
+    def _run(self):
+        while not self._stop.is_set():
+            batch = self._next_batch()
+            if batch:
+                for url in self.urls:
+                    self.deliver(url, batch)
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='alert-notifier', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.timeout + 1)
+            self._thread = None
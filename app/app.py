@@ -5,12 +5,20 @@ import psutil
 import platform
 import socket
 import os
+import sys
+import atexit
+import signal
+import shutil
+import tempfile
+import threading
+import functools
 import subprocess
 import logging
-import requests
+from types import SimpleNamespace
 from datetime import datetime
-from flask import Flask, render_template, jsonify
+from flask import Flask, Response, render_template, jsonify, request
 from flask_socketio import SocketIO
+from client_streams import ClientStreamManager
 
 # Configure logging
 logging.basicConfig(
@@ -30,6 +38,58 @@ socketio = SocketIO(app, cors_allowed_origins="*", async_mode='threading')
 last_disk_io = None
 last_network_io = None
 last_check_time = None
+last_cpu_times = None
+# On-demand requests (/api/cpu, get_data) keep their own CPU baseline so they
+# do not shorten the collection tick's measurement window
+on_demand_cpu_times = None
+
+# Host facts that do not change until reboot, computed once
+static_host_facts = None
+
+# Rate baselines and host facts are saved here on shutdown and reused on the
+# next start when the boot ID matches, so the first tick already has valid rates
+STATE_FILE = os.environ.get('STATE_FILE', os.path.join(tempfile.gettempdir(), 'system_monitor_state.json'))
+STATE_MAX_AGE = int(os.environ.get('STATE_MAX_AGE', 300))
+
+# Optional high-frequency sampler (Hz, 0 disables it); Linux only as it reads /proc
+BURST_SAMPLE_HZ = float(os.environ.get('BURST_SAMPLE_HZ', 0))
+burst_sampler = None
+
+# cgroup v2 mount to account containers from (mount the host's to see sibling containers)
+CGROUP_ROOT = os.environ.get('CGROUP_ROOT', '/sys/fs/cgroup')
+cgroup_collector = None
+
+# Alert rules (JSON file) and comma-separated webhook URLs to notify
+ALERT_RULES_FILE = os.environ.get('ALERT_RULES_FILE')
+ALERT_WEBHOOK_URLS = [url.strip() for url in os.environ.get('ALERT_WEBHOOK_URLS', '').split(',') if url.strip()]
+alert_engine = None
+
+# Record every snapshot to this file (gzip-framed, delta-encoded NDJSON)
+RECORDING_PATH = os.environ.get('RECORDING_PATH')
+RECORDING_KEYFRAME_INTERVAL = int(os.environ.get('RECORDING_KEYFRAME_INTERVAL', 30))
+recorder = None
+
+# Serve a recording instead of live data, at REPLAY_SPEED (1-100x)
+REPLAY_PATH = os.environ.get('REPLAY_PATH')
+REPLAY_SPEED = float(os.environ.get('REPLAY_SPEED', 1))
+replayer = None
+
+# Seconds between snapshots
+EMIT_INTERVAL = 2
+
+# Where collection happens:
+#   inline - the web process samples the host itself (single worker)
+#   shared - spawn one collector process that publishes to shared memory
+#   attach - read from a collector started separately (python app/collector.py)
+COLLECTOR_MODE = os.environ.get('COLLECTOR_MODE', 'inline').lower()
+SNAPSHOT_SHM_NAME = os.environ.get('SNAPSHOT_SHM_NAME', 'system_monitor_snapshot')
+snapshot_reader = None
+
+# Events emitted for each snapshot, in emit order
+SNAPSHOT_EVENTS = ('system_info', 'cpu_info', 'memory_info', 'disk_info', 'network_info', 'process_info', 'cgroup_info', 'alert_info', 'replay_info', 'timestamp')
+
+# Per-client send queues keeping only the latest frame per event, paced by acknowledgements
+client_streams = ClientStreamManager(socketio.emit, SNAPSHOT_EVENTS)
 
 # Health threshold constants
 HEALTH_THRESHOLDS = {
@@ -120,17 +180,61 @@ def calculate_health_score():
         logger.error(f"Error calculating health score: {str(e)}")
         return {"score": "N/A", "status": "Unknown", "issues": ["Unable to calculate health"]}
 
+# Facts about the host that only change on reboot (platform.processor() may spawn uname)
+def get_static_host_facts():
+    global static_host_facts
+    if static_host_facts is None:
+        facts = {}
+        facts['platform'] = platform.system()
+        facts['platform_release'] = platform.release()
+        facts['platform_version'] = platform.version()
+        facts['architecture'] = platform.machine()
+        facts['hostname'] = socket.gethostname()
+        facts['processor'] = platform.processor()
+        facts['boot_time'] = datetime.fromtimestamp(psutil.boot_time()).strftime("%Y-%m-%d %H:%M:%S")
+        
+        # Get kernel version (Linux)
+        if os.path.exists('/proc/version'):
+            with open('/proc/version', 'r') as f:
+                facts['kernel_version'] = f.read().strip()
+        
+        # Get distro info (Linux)
+        if os.path.exists('/etc/os-release'):
+            with open('/etc/os-release', 'r') as f:
+                os_release = {}
+                for line in f:
+                    if '=' in line:
+                        key, value = line.rstrip().split('=', 1)
+                        os_release[key] = value.strip('"')
+                if 'PRETTY_NAME' in os_release:
+                    facts['distro'] = os_release['PRETTY_NAME']
+        
+        # Get detailed CPU info from /proc/cpuinfo (Linux)
+        if os.path.exists('/proc/cpuinfo'):
+            cpu_detailed_info = {}
+            current_processor = None
+            
+            with open('/proc/cpuinfo', 'r') as f:
+                for line in f:
+                    if line.strip():
+                        if line.startswith('processor'):
+                            current_processor = int(line.split(':')[1].strip())
+                            cpu_detailed_info[current_processor] = {}
+                        elif current_processor is not None and ':' in line:
+                            key, value = line.split(':', 1)
+                            cpu_detailed_info[current_processor][key.strip()] = value.strip()
+            
+            if cpu_detailed_info:
+                facts['cpu_detailed_info'] = cpu_detailed_info
+        
+        static_host_facts = facts
+    return static_host_facts
+
 # Get system information
 def get_system_info():
     try:
-        info = {}
-        info['platform'] = platform.system()
-        info['platform_release'] = platform.release()
-        info['platform_version'] = platform.version()
-        info['architecture'] = platform.machine()
-        info['hostname'] = socket.gethostname()
-        info['processor'] = platform.processor()
-        info['boot_time'] = datetime.fromtimestamp(psutil.boot_time()).strftime("%Y-%m-%d %H:%M:%S")
+        facts = get_static_host_facts()
+        info = {key: value for key, value in facts.items() if key != 'cpu_detailed_info'}
         
         # Get number of users logged in
         info['users_logged_in'] = len(psutil.users())
@@ -154,22 +258,6 @@ def get_system_info():
                 '15min': round(load15, 2)
             }
         
-        # Get kernel version (Linux)
-        if os.path.exists('/proc/version'):
-            with open('/proc/version', 'r') as f:
-                info['kernel_version'] = f.read().strip()
-        
-        # Get distro info (Linux)
-        if os.path.exists('/etc/os-release'):
-            with open('/etc/os-release', 'r') as f:
-                os_release = {}
-                for line in f:
-                    if '=' in line:
-                        key, value = line.rstrip().split('=', 1)
-                        os_release[key] = value.strip('"')
-                if 'PRETTY_NAME' in os_release:
-                    info['distro'] = os_release['PRETTY_NAME']
-        
         # Get uptime
         info['uptime_seconds'] = int(time.time() - psutil.boot_time())
         
@@ -179,7 +267,7 @@ def get_system_info():
         return {"error": str(e)}
 
 # Get CPU information with temperature data if available
-def get_cpu_info():
+def get_cpu_info(tick=True):
     try:
         cpu_info = {}
         cpu_info['physical_cores'] = psutil.cpu_count(logical=False)
@@ -205,10 +293,11 @@ def get_cpu_info():
         except:
             pass
         
-        cpu_info['usage_per_core'] = [f"{percentage:.2f}%" for percentage in psutil.cpu_percent(percpu=True, interval=1)]
-        cpu_info['raw_usage_per_core'] = [percentage for percentage in psutil.cpu_percent(percpu=True, interval=0)]
-        cpu_info['total_usage'] = f"{psutil.cpu_percent()}%"
-        cpu_info['raw_total_usage'] = psutil.cpu_percent()
+        per_core_usage, total_usage = calculate_cpu_usage(tick)
+        cpu_info['usage_per_core'] = [f"{percentage:.2f}%" for percentage in per_core_usage]
+        cpu_info['raw_usage_per_core'] = per_core_usage
+        cpu_info['total_usage'] = f"{total_usage}%"
+        cpu_info['raw_total_usage'] = total_usage
         
         # Try to get CPU temperature (works on many Linux systems)
         try:
@@ -217,7 +306,7 @@ def get_cpu_info():
                     temp = int(f.read().strip()) / 1000
                     cpu_info['temperature'] = f"{temp:.1f}°C"
                     cpu_info['raw_temperature'] = temp
-            elif platform.system() == 'Linux':
+            elif platform.system() == 'Linux' and find_tool('sensors'):
                 # Try using sensors command on Linux
                 try:
                     sensors_output = subprocess.check_output(['sensors'], universal_newlines=True)
@@ -237,23 +326,10 @@ def get_cpu_info():
             cpu_info['temperature'] = "N/A"
             cpu_info['raw_temperature'] = None
         
-        # Get detailed CPU info from /proc/cpuinfo (Linux)
-        if os.path.exists('/proc/cpuinfo'):
-            cpu_detailed_info = {}
-            current_processor = None
-            
-            with open('/proc/cpuinfo', 'r') as f:
-                for line in f:
-                    if line.strip():
-                        if line.startswith('processor'):
-                            current_processor = int(line.split(':')[1].strip())
-                            cpu_detailed_info[current_processor] = {}
-                        elif current_processor is not None and ':' in line:
-                            key, value = line.split(':', 1)
-                            cpu_detailed_info[current_processor][key.strip()] = value.strip()
-            
-            if cpu_detailed_info:
-                cpu_info['detailed_info'] = cpu_detailed_info
+        # Detailed CPU info from /proc/cpuinfo (Linux), parsed once
+        cpu_detailed_info = get_static_host_facts().get('cpu_detailed_info')
+        if cpu_detailed_info:
+            cpu_info['detailed_info'] = cpu_detailed_info
         
         return cpu_info
     except Exception as e:
@@ -267,6 +343,8 @@ def get_gpu_info():
         
         try:
             # Try nvidia-smi for NVIDIA GPUs
+            if not find_tool('nvidia-smi'):
+                raise FileNotFoundError('nvidia-smi not found')
             nvidia_output = subprocess.check_output(['nvidia-smi', '--query-gpu=name,temperature.gpu,utilization.gpu,memory.used,memory.total,power.draw,power.limit,fan.speed', '--format=csv,noheader,nounits'], universal_newlines=True)
             if nvidia_output:
                 gpu_info['available'] = True
@@ -320,6 +398,8 @@ def get_gpu_info():
             
             # Try lspci for basic detection
             try:
+                if not find_tool('lspci'):
+                    raise FileNotFoundError('lspci not found')
                 lspci_output = subprocess.check_output(['lspci', '-vnn'], universal_newlines=True)
                 if 'VGA' in lspci_output or '3D controller' in lspci_output:
                     gpu_info['available'] = True
@@ -505,6 +585,117 @@ def get_network_info():
         logger.error(f"Error getting network info: {str(e)}")
         return {"error": str(e)}
 
+# Look up optional command line tools once instead of spawning them on every call
+@functools.lru_cache(maxsize=None)
+def find_tool(name):
+    return shutil.which(name)
+
+# Split a cpu_times entry into (total, idle) jiffies, as psutil.cpu_percent does
+def _cpu_total_idle(times):
+    fields = times._asdict() if hasattr(times, '_asdict') else vars(times)
+    # guest time is already included in user time on Linux
+    total = sum(fields.values()) - fields.get('guest', 0) - fields.get('guest_nice', 0)
+    return total, fields.get('idle', 0) + fields.get('iowait', 0)
+
+# Calculate CPU usage since the previous call from cpu_times deltas (non-blocking);
+# the tick and on-demand callers each measure against their own previous call
+def calculate_cpu_usage(tick=True):
+    global last_cpu_times, on_demand_cpu_times
+    current = psutil.cpu_times(percpu=True)
+    if tick:
+        previous, last_cpu_times = last_cpu_times, current
+    else:
+        previous, on_demand_cpu_times = on_demand_cpu_times, current
+    
+    per_core = []
+    busy_sum = total_sum = 0
+    if previous and len(previous) == len(current):
+        for before, after in zip(previous, current):
+            total_before, idle_before = _cpu_total_idle(before)
+            total_after, idle_after = _cpu_total_idle(after)
+            total = total_after - total_before
+            busy = total - (idle_after - idle_before)
+            per_core.append(round(max(0.0, min(100.0, busy / total * 100)), 1) if total > 0 else 0.0)
+            busy_sum += busy
+            total_sum += total
+    
+    if total_sum <= 0:
+        # No usable baseline yet (first call or called twice in a row): take a short sample
+        per_core = psutil.cpu_percent(percpu=True, interval=0.1)
+        return per_core, round(sum(per_core) / len(per_core), 1) if per_core else 0.0
+    return per_core, round(max(0.0, min(100.0, busy_sum / total_sum * 100)), 1)
+
+# Identify the current boot, so saved counters are only reused on the same boot
+def read_boot_id():
+    try:
+        with open('/proc/sys/kernel/random/boot_id') as f:
+            return f.read().strip()
+    except OSError:
+        return str(int(psutil.boot_time()))
+
+def _as_dict(counters):
+    return counters._asdict() if hasattr(counters, '_asdict') else vars(counters)
+
+# Persist rate baselines and static host facts for the next start
+def save_baseline_state():
+    if last_check_time is None:
+        return
+    try:
+        state = {
+            'boot_id': read_boot_id(),
+            'saved_at': last_check_time,
+            'disk_io': _as_dict(last_disk_io) if last_disk_io else None,
+            'network_io': _as_dict(last_network_io) if last_network_io else None,
+            'cpu_times': [_as_dict(times) for times in last_cpu_times] if last_cpu_times else None,
+            'host': static_host_facts
+        }
+        temp_path = f"{STATE_FILE}.{os.getpid()}.tmp"
+        with open(temp_path, 'w') as f:
+            json.dump(state, f)
+        os.replace(temp_path, STATE_FILE)
+        logger.info(f"Saved rate baselines to {STATE_FILE}")
+    except Exception as e:
+        logger.error(f"Error saving baseline state: {str(e)}")
+
+# Restore rate baselines saved by a previous run on the same boot; returns
+# True only when the I/O counters were restored, so the seed sample is skipped
+def load_baseline_state():
+    global last_disk_io, last_network_io, last_check_time, last_cpu_times, static_host_facts
+    try:
+        with open(STATE_FILE) as f:
+            state = json.load(f)
+    except FileNotFoundError:
+        return False
+    except Exception as e:
+        logger.warning(f"Ignoring unreadable baseline state {STATE_FILE}: {str(e)}")
+        return False
+    
+    if state.get('boot_id') != read_boot_id():
+        logger.info("Baseline state is from a previous boot, ignoring it")
+        return False
+    if time.time() - state.get('saved_at', 0) > STATE_MAX_AGE:
+        logger.info("Baseline state is too old, ignoring it")
+        return False
+    
+    restored = bool(state.get('disk_io') and state.get('network_io'))
+    if restored:
+        last_disk_io = SimpleNamespace(**state['disk_io'])
+        last_network_io = SimpleNamespace(**state['network_io'])
+        last_check_time = state['saved_at']
+    if state.get('cpu_times'):
+        last_cpu_times = [SimpleNamespace(**times) for times in state['cpu_times']]
+    if state.get('host'):
+        # JSON turned the processor numbers into strings
+        host = state['host']
+        if 'cpu_detailed_info' in host:
+            host['cpu_detailed_info'] = {int(k): v for k, v in host['cpu_detailed_info'].items()}
+        static_host_facts = host
+    if restored:
+        logger.info(f"Restored rate baselines from {STATE_FILE}")
+    else:
+        logger.info(f"Baseline state in {STATE_FILE} has no I/O counters, seeding them again")
+    return restored
+
 # Calculate I/O rates
 def calculate_io_rates():
     global last_disk_io, last_network_io, last_check_time
@@ -611,6 +802,20 @@ def get_process_info():
         logger.error(f"Error getting process info: {str(e)}")
         return {"error": str(e)}
 
+# Get per-cgroup and per-container resource usage (cgroup v2); only the
+# collection tick refreshes it, other callers reuse the tick's rates.
+# The tick's result lists the busiest containers, full=True lists all of them
+def get_cgroup_info(refresh=True, full=False):
+    global cgroup_collector
+    try:
+        if cgroup_collector is None:
+            from cgroups import CgroupCollector
+            cgroup_collector = CgroupCollector(CGROUP_ROOT)
+        return cgroup_collector.collect() if refresh else cgroup_collector.latest(full=full)
+    except Exception as e:
+        logger.error(f"Error getting cgroup info: {str(e)}")
+        return {"error": str(e), "available": False}
+
 # Get weather information (if API key is available)
 def get_weather_info():
     try:
@@ -628,6 +833,7 @@ def get_weather_info():
         # Uncomment and configure with your own API key to get real weather data
         # OPENWEATHER_API_KEY = os.environ.get('OPENWEATHER_API_KEY')
         # if OPENWEATHER_API_KEY:
+        #     import requests  # Imported lazily, only the weather lookup needs it
         #     # Get location by IP (in a real app, you might want to set this manually)
         #     ip_response = requests.get('https://ipapi.co/json/')
         #     if ip_response.status_code == 200:
@@ -655,6 +861,77 @@ def get_weather_info():
         logger.error(f"Error getting weather info: {str(e)}")
         return {"available": False, "error": str(e)}
 
+# Attach burst-window aggregates to the emitted payloads
+def attach_burst_stats(cpu_info, memory_info, disk_info, network_info, window):
+    if not window:
+        return
+    cpu_info['burst'] = dict(window['cpu'], sampler=window['sampler'])
+    memory_info['burst'] = window['memory']
+    disk_info['burst'] = window['disk']
+    network_info['burst'] = window['network']
+
+# Start the burst sampler if configured and supported on this platform
+def start_burst_sampler():
+    global burst_sampler
+    if BURST_SAMPLE_HZ <= 0 or burst_sampler is not None:
+        return
+    if not os.path.exists('/proc/stat'):
+        logger.warning("Burst sampler requires /proc, disabled on this platform")
+        return
+    try:
+        from burst_sampler import BurstSampler
+        burst_sampler = BurstSampler(hz=BURST_SAMPLE_HZ).start()
+    except Exception as e:
+        logger.error(f"Could not start burst sampler: {str(e)}")
+
+# Load alert rules and start the webhook notifier, if configured
+def start_alerting():
+    global alert_engine
+    if not ALERT_RULES_FILE or alert_engine is not None:
+        return
+    try:
+        from alerts import AlertEngine, WebhookNotifier
+        notifier = WebhookNotifier(ALERT_WEBHOOK_URLS).start() if ALERT_WEBHOOK_URLS else None
+        alert_engine = AlertEngine.from_file(ALERT_RULES_FILE, notifier)
+        logger.info(f"Loaded {len(alert_engine.rules)} alert rules from {ALERT_RULES_FILE}")
+    except Exception as e:
+        logger.error(f"Could not load alert rules: {str(e)}")
+
+# Get currently firing alerts
+def get_alert_info():
+    if alert_engine:
+        return alert_engine.active_alerts()
+    if COLLECTOR_MODE != 'inline':
+        # Rules are evaluated in the collector process
+        _, snapshot = read_shared_snapshot()
+        if snapshot and 'alert_info' in snapshot:
+            return snapshot['alert_info']
+    return {'alerts': [], 'rules': 0}
+
+# Start recording snapshots, if configured
+def start_recording():
+    global recorder
+    if not RECORDING_PATH or recorder is not None:
+        return
+    try:
+        from recorder import RecordingWriter
+        recorder = RecordingWriter(RECORDING_PATH, keyframe_interval=RECORDING_KEYFRAME_INTERVAL)
+        # Finish the open gzip member on a clean shutdown
+        atexit.register(recorder.close)
+        logger.info(f"Recording snapshots to {RECORDING_PATH}")
+    except Exception as e:
+        logger.error(f"Could not open recording {RECORDING_PATH}: {str(e)}")
+
+# Serve one topic; outside inline mode the collector process owns the
+# counters, so answer from its latest snapshot instead of sampling here
+def current_topic(event, collect):
+    if COLLECTOR_MODE == 'inline':
+        return collect()
+    _, snapshot = read_shared_snapshot()
+    if snapshot is None:
+        return {"error": "No snapshot published by the collector yet"}
+    return snapshot.get(event, {})
+
 # Routes
 @app.route('/')
 def index():
@@ -670,7 +947,7 @@ def api_health():
 
 @app.route('/api/cpu')
 def api_cpu():
-    return jsonify(get_cpu_info())
+    return jsonify(current_topic('cpu_info', lambda: get_cpu_info(tick=False)))
 
 @app.route('/api/gpu')
 def api_gpu():
@@ -678,134 +955,271 @@ def api_gpu():
 
 @app.route('/api/memory')
 def api_memory():
-    return jsonify(get_memory_info())
+    return jsonify(current_topic('memory_info', lambda: get_memory_info()))
 
 @app.route('/api/disk')
 def api_disk():
-    return jsonify(get_disk_info())
+    return jsonify(current_topic('disk_info', lambda: get_disk_info()))
 
 @app.route('/api/network')
 def api_network():
-    return jsonify(get_network_info())
+    return jsonify(current_topic('network_info', lambda: get_network_info()))
 
 @app.route('/api/processes')
 def api_processes():
-    return jsonify(get_process_info())
+    return jsonify(current_topic('process_info', lambda: get_process_info()))
+
+@app.route('/api/cgroups')
+def api_cgroups():
+    # Every container in inline mode (the collector process only publishes the
+    # busiest); page through them with ?offset=&limit=
+    info = current_topic('cgroup_info', lambda: get_cgroup_info(refresh=False, full=True))
+    if 'containers' in info:
+        offset = max(0, request.args.get('offset', 0, type=int))
+        limit = request.args.get('limit', type=int)
+        end = offset + limit if limit is not None and limit >= 0 else None
+        info = dict(info, containers=info['containers'][offset:end], offset=offset)
+    return jsonify(info)
+
+@app.route('/api/alerts')
+def api_alerts():
+    return jsonify(get_alert_info())
+
+@app.route('/api/history/export')
+def api_history_export():
+    """Stream a recording, raw (format=gzip) or decoded (format=ndjson, optional start/end)."""
+    path = RECORDING_PATH or REPLAY_PATH
+    if not path or not os.path.exists(path):
+        return jsonify({"error": "No recording available"}), 404
+    from recorder import RecordingReader
+    reader = RecordingReader(path)
+    if request.args.get('format', 'ndjson') == 'gzip':
+        return Response(reader.iter_bytes(), mimetype='application/gzip',
+                        headers={'Content-Disposition': f'attachment; filename={os.path.basename(path)}'})
+    start = request.args.get('start', type=float)
+    end = request.args.get('end', type=float)
+    return Response(reader.iter_ndjson(start, end), mimetype='application/x-ndjson')
+
+@app.route('/api/clients')
+def api_clients():
+    return jsonify(client_streams.stats())
 
 @app.route('/api/weather')
 def api_weather():
     return jsonify(get_weather_info())
 
+# Collect every emitted topic into one snapshot
+def collect_snapshot(tick=True):
+    """Collect one snapshot of all topics, keyed by Socket.IO event name.
+
+    Only the collection tick (tick=True) advances windowed state such as the
+    burst window, CPU baseline and cgroup rates; on-demand requests do not.
+    """
+    # Get IO rates
+    io_rates = calculate_io_rates()
+    
+    cpu_info = get_cpu_info(tick)
+    memory_info = get_memory_info()
+    disk_info = get_disk_info()
+    network_info = get_network_info()
+    
+    # Close the burst window that covers this emit interval; on-demand
+    # requests reuse the last closed window instead of cutting it short
+    if burst_sampler:
+        window = burst_sampler.roll() if tick else burst_sampler.last_window()
+        attach_burst_stats(cpu_info, memory_info, disk_info, network_info, window)
+    
+    if io_rates:
+        disk_info['io_rates'] = io_rates
+        network_info['io_rates'] = io_rates
+    
+    return {
+        'system_info': get_system_info(),
+        'cpu_info': cpu_info,
+        'memory_info': memory_info,
+        'disk_info': disk_info,
+        'network_info': network_info,
+        'process_info': get_process_info(),
+        'cgroup_info': get_cgroup_info(refresh=tick),
+        'timestamp': {'time': datetime.now().strftime('%H:%M:%S')}
+    }
+
+# Collect the snapshot for one tick and run everything that consumes it
+def collect_tick():
+    snapshot = collect_snapshot()
+    if alert_engine:
+        try:
+            # Rules see every container, not just the busiest ones that are emitted
+            alert_engine.evaluate(dict(snapshot, cgroup_info=get_cgroup_info(refresh=False, full=True)))
+            snapshot['alert_info'] = alert_engine.active_alerts()
+        except Exception as e:
+            logger.error(f"Error evaluating alerts: {str(e)}")
+    if recorder:
+        try:
+            recorder.append(snapshot)
+        except Exception as e:
+            logger.error(f"Error recording snapshot: {str(e)}")
+    return snapshot
+
+# Queue a snapshot for all clients, or for a single client when room is given;
+# slow clients skip superseded frames instead of building a backlog
+def emit_snapshot(snapshot, room=None):
+    client_streams.publish(snapshot, sid=room)
+
+# Latest snapshot published by the collector process; decoded once per
+# generation and shared between callers, so it must not be modified
+def read_shared_snapshot():
+    global snapshot_reader
+    if snapshot_reader is None:
+        from snapshot_store import SnapshotReader
+        snapshot_reader = SnapshotReader(SNAPSHOT_SHM_NAME)
+    return snapshot_reader.read()
+
+# Seed the I/O and CPU counters so the first emitted rates are valid
+def seed_io_rates():
+    global last_disk_io, last_network_io, last_check_time, last_cpu_times
+    if last_cpu_times is None:
+        last_cpu_times = psutil.cpu_times(percpu=True)
+    # Skipped when load_baseline_state() restored counters from the last run
+    if last_check_time is None:
+        last_check_time = time.time()
+        last_disk_io = psutil.disk_io_counters()
+        last_network_io = psutil.net_io_counters()
+        time.sleep(1)  # Wait to get initial rates
+
+# Entry point of the dedicated collector process
+def collector_main():
+    from collector import run_collector
+    load_baseline_state()
+    start_burst_sampler()
+    start_alerting()
+    start_recording()
+    seed_io_rates()
+    try:
+        run_collector(collect_tick, SNAPSHOT_SHM_NAME, EMIT_INTERVAL)
+    finally:
+        # Child processes skip atexit handlers, so save explicitly
+        save_baseline_state()
+        if recorder:
+            recorder.close()
+
 # Background task to emit data to clients
 def background_task():
     """Background task to emit system metrics to connected clients."""
-    global last_disk_io, last_network_io, last_check_time
-    
     try:
-        # Calculate rates for first time
-        if last_check_time is None:
-            last_check_time = time.time()
-            last_disk_io = psutil.disk_io_counters()
-            last_network_io = psutil.net_io_counters()
-            time.sleep(1)  # Wait to get initial rates
-        
-        while True:
-            # Exit if no clients connected
-            if not socketio.server.manager.rooms:
+        if COLLECTOR_MODE == 'inline':
+            seed_io_rates()
+        
+        last_generation = 0
+        # Stop once the server's main thread exits (SIGTERM or Ctrl+C), so the
+        # interpreter can run its exit handlers and stop the collector process
+        while threading.main_thread().is_alive():
+            # Exit if no clients connected (alerts and recording keep the collection running)
+            if not socketio.server.manager.rooms and not alert_engine and not recorder:
                 time.sleep(5)  # Check every 5 seconds for new connections
                 continue
                 
             try:
-                # Get IO rates
-                io_rates = calculate_io_rates()
-                
-                # Emit system info
-                socketio.emit('system_info', get_system_info())
+                if COLLECTOR_MODE == 'inline':
+                    snapshot = collect_tick()
+                else:
+                    # Poll shared memory; emit only when the collector published something new
+                    generation, snapshot = read_shared_snapshot()
+                    if snapshot is None or generation == last_generation:
+                        time.sleep(EMIT_INTERVAL / 4)
+                        continue
+                    last_generation = generation
                 
-                # Emit CPU info
-                socketio.emit('cpu_info', get_cpu_info())
-                
-                # Emit Memory info
-                socketio.emit('memory_info', get_memory_info())
-                
-                # Emit Disk info
-                disk_info = get_disk_info()
-                if io_rates:
-                    disk_info['io_rates'] = io_rates
-                socketio.emit('disk_info', disk_info)
-                
-                # Emit Network info
-                network_info = get_network_info()
-                if io_rates:
-                    network_info['io_rates'] = io_rates
-                socketio.emit('network_info', network_info)
-                
-                # Emit Process info
-                socketio.emit('process_info', get_process_info())
-                
-                # Add timestamp
-                timestamp = datetime.now().strftime('%H:%M:%S')
-                socketio.emit('timestamp', {'time': timestamp})
+                emit_snapshot(snapshot)
                 
                 # Log activity
-                logger.debug(f"Data emitted at {timestamp}")
+                logger.debug(f"Data emitted at {snapshot['timestamp']['time']}")
                 
             except Exception as e:
                 logger.error(f"Error in background task: {str(e)}")
             
             # Sleep between updates
-            time.sleep(2)
+            time.sleep(EMIT_INTERVAL if COLLECTOR_MODE == 'inline' else EMIT_INTERVAL / 4)
             
     except Exception as e:
         logger.error(f"Background task error: {str(e)}")
 
+# Replay a recording through the same events as live data
+def replay_task():
+    """Background task to emit recorded snapshots to connected clients."""
+    try:
+        for snapshot in replayer.frames():
+            snapshot = dict(snapshot, replay_info=replayer.status())
+            emit_snapshot(snapshot)
+    except Exception as e:
+        logger.error(f"Replay task error: {str(e)}")
+
 @socketio.on('connect')
 def handle_connect():
     """Handle client connection."""
+    client_streams.add(request.sid)
     logger.info('Client connected')
 
 @socketio.on('disconnect')
 def handle_disconnect():
     """Handle client disconnection."""
+    client_streams.remove(request.sid)
     logger.info('Client disconnected')
 
 @socketio.on('get_data')
 def handle_get_data():
     """Handle client request for fresh data."""
     try:
-        # Get IO rates
-        io_rates = calculate_io_rates()
-        
-        # Emit all data
-        socketio.emit('system_info', get_system_info(), room=request.sid)
-        socketio.emit('cpu_info', get_cpu_info(), room=request.sid)
-        socketio.emit('memory_info', get_memory_info(), room=request.sid)
-        
-        # Emit Disk info
-        disk_info = get_disk_info()
-        if io_rates:
-            disk_info['io_rates'] = io_rates
-        socketio.emit('disk_info', disk_info, room=request.sid)
-        
-        # Emit Network info
-        network_info = get_network_info()
-        if io_rates:
-            network_info['io_rates'] = io_rates
-        socketio.emit('network_info', network_info, room=request.sid)
-        
-        # Emit Process info
-        socketio.emit('process_info', get_process_info(), room=request.sid)
-        
-        # Add timestamp
-        timestamp = datetime.now().strftime('%H:%M:%S')
-        socketio.emit('timestamp', {'time': timestamp}, room=request.sid)
+        if replayer:
+            snapshot = replayer.current and dict(replayer.current, replay_info=replayer.status())
+        elif COLLECTOR_MODE == 'inline':
+            snapshot = collect_snapshot(tick=False)
+        else:
+            _, snapshot = read_shared_snapshot()
+        if snapshot:
+            emit_snapshot(snapshot, room=request.sid)
         
     except Exception as e:
         logger.error(f"Error handling get_data: {str(e)}")
 
+@socketio.on('replay_control')
+def handle_replay_control(data):
+    """Handle replay speed changes and seeks ({'speed': 10, 'seek': <unix time>})."""
+    if not replayer or not isinstance(data, dict):
+        return
+    try:
+        if 'speed' in data:
+            replayer.set_speed(data['speed'])
+        if 'seek' in data:
+            replayer.seek(data['seek'])
+    except (TypeError, ValueError) as e:
+        logger.warning(f"Invalid replay control {data}: {str(e)}")
+
 if __name__ == '__main__':
+    if REPLAY_PATH:
+        # Serve a recording instead of sampling this host
+        from recorder import Replayer
+        replayer = Replayer(REPLAY_PATH, speed=REPLAY_SPEED)
+        logger.info(f"Replaying {REPLAY_PATH} at {replayer.speed:g}x")
+    elif COLLECTOR_MODE == 'shared':
+        # Sample in a dedicated process; this web process only reads snapshots.
+        # Exiting through sys.exit lets multiprocessing stop the collector too
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+        from collector import start_collector_process
+        start_collector_process(collector_main)
+    elif COLLECTOR_MODE == 'inline':
+        # Reuse counters from the previous run, and save them again on shutdown
+        load_baseline_state()
+        atexit.register(save_baseline_state)
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+        
+        # Start the optional burst sampler before the first emit window opens
+        start_burst_sampler()
+        start_alerting()
+        start_recording()
+    
     # Start background task for real-time updates
-    socketio.start_background_task(background_task)
+    socketio.start_background_task(replay_task if replayer else background_task)
     
     # Get host and port from environment or use defaults
     host = os.environ.get('HOST', '0.0.0.0')
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""Startup benchmark: import time and time-to-first-payload.
+
+Each run starts a fresh interpreter, imports the app, seeds the rate
+baselines and collects the first full snapshot, the same path the
+background task takes before its first emit. Runs are repeated cold (no
+saved state) and warm (state saved by a previous run on this boot); a run
+counts as restored when the saved baselines were loaded and the one-second
+seed sample was skipped.
+
+    python app/bench_startup.py [runs]
+"""
+import os
+import sys
+import json
+import statistics
+import subprocess
+import tempfile
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+PROBE = """
+import time, json
+started = time.perf_counter()
+import app
+imported = time.perf_counter()
+restored = app.load_baseline_state()
+app.seed_io_rates()
+snapshot = app.collect_snapshot()
+first_payload = time.perf_counter()
+app.save_baseline_state()
+print(json.dumps({
+    'import_ms': (imported - started) * 1000,
+    'first_payload_ms': (first_payload - started) * 1000,
+    'restored': restored
+}))
+"""
+
+
+def run_probe(state_file):
+    env = dict(os.environ, STATE_FILE=state_file)
+    output = subprocess.check_output([sys.executable, '-c', PROBE], cwd=APP_DIR, env=env,
+                                     stderr=subprocess.DEVNULL, universal_newlines=True)
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def summarise(label, results):
+    imports = [r['import_ms'] for r in results]
+    payloads = [r['first_payload_ms'] for r in results]
+    print(f"{label:>5}: import {statistics.median(imports):7.1f} ms   "
+          f"first payload {statistics.median(payloads):7.1f} ms (median of {len(results)}), "
+          f"baselines restored {sum(r['restored'] for r in results)}/{len(results)}")
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    with tempfile.TemporaryDirectory() as directory:
+        state_file = os.path.join(directory, 'state.json')
+        cold = []
+        for _ in range(runs):
+            if os.path.exists(state_file):
+                os.remove(state_file)
+            cold.append(run_probe(state_file))
+        warm = [run_probe(state_file) for _ in range(runs)]
+    summarise('cold', cold)
+    summarise('warm', warm)
+
+
+if __name__ == '__main__':
+    main()
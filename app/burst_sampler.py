@@ -0,0 +1,368 @@
+#!/usr/bin/env python3
+"""High-frequency sampler for cheap /proc counters.
+
+The dashboard emits a snapshot every couple of seconds, which averages away
+short CPU, disk and network bursts. This module samples /proc/stat,
+/proc/meminfo, /proc/diskstats and /proc/net/dev at 10-20 Hz on a background
+thread and folds every sample into per-window min/max/mean/p95 aggregates.
+Memory use is constant: each series keeps a handful of running values and a
+preallocated buffer of samples, from which the 95th percentile is computed
+exactly. A window of 2 s at 10-20 Hz holds only 20-40 samples, too few for
+a streaming estimate; only a window that outgrows the buffer (nobody rolled
+it for minutes) falls back to a five-marker P-square estimator.
+"""
+import os
+import time
+import logging
+import threading
+
+logger = logging.getLogger('system_monitor')
+
+# /proc/diskstats always counts in 512-byte sectors, regardless of the device
+SECTOR_SIZE = 512
+
+# Keep the sampler's own CPU time under this share of one core
+DEFAULT_OVERHEAD_BUDGET = 1.0
+
+# Samples per series and window kept for the exact p95 (about 50 s at 20 Hz)
+EXACT_QUANTILE_SAMPLES = 1024
+
+
+def exact_quantile(values, quantile):
+    """Quantile of sorted values, interpolating linearly between closest ranks."""
+    position = quantile * (len(values) - 1)
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+
+class P2Quantile:
+    """Streaming quantile estimate (Jain & Chlamtac P-square), O(1) memory."""
+
+    def __init__(self, quantile):
+        self.quantile = quantile
+        self.reset()
+
+    def reset(self):
+        self.count = 0
+        self.heights = []
+        self.positions = [1, 2, 3, 4, 5]
+        q = self.quantile
+        self.desired = [1, 1 + 2 * q, 1 + 4 * q, 3 + 2 * q, 5]
+        self.increments = [0, q / 2, q, (1 + q) / 2, 1]
+
+    def add(self, value):
+        self.count += 1
+        if self.count <= 5:
+            self.heights.append(value)
+            self.heights.sort()
+            return
+
+        heights = self.heights
+        positions = self.positions
+        if value < heights[0]:
+            heights[0] = value
+            k = 0
+        elif value >= heights[4]:
+            heights[4] = value
+            k = 3
+        else:
+            k = 0
+            while value >= heights[k + 1]:
+                k += 1
+
+        for i in range(k + 1, 5):
+            positions[i] += 1
+        for i in range(5):
+            self.desired[i] += self.increments[i]
+
+        # Adjust the three middle markers towards their desired positions
+        for i in range(1, 4):
+            delta = self.desired[i] - positions[i]
+            if (delta >= 1 and positions[i + 1] - positions[i] > 1) or \
+               (delta <= -1 and positions[i - 1] - positions[i] < -1):
+                step = 1 if delta > 0 else -1
+                candidate = self._parabolic(i, step)
+                if not heights[i - 1] < candidate < heights[i + 1]:
+                    candidate = heights[i] + step * (heights[i + step] - heights[i]) / (positions[i + step] - positions[i])
+                heights[i] = candidate
+                positions[i] += step
+
+    def _parabolic(self, i, step):
+        h = self.heights
+        n = self.positions
+        return h[i] + step / (n[i + 1] - n[i - 1]) * (
+            (n[i] - n[i - 1] + step) * (h[i + 1] - h[i]) / (n[i + 1] - n[i]) +
+            (n[i + 1] - n[i] - step) * (h[i] - h[i - 1]) / (n[i] - n[i - 1])
+        )
+
+    def value(self):
+        if self.count == 0:
+            return None
+        if self.count <= 5:
+            # Too few samples for the markers, use the nearest rank
+            index = min(len(self.heights) - 1, int(round(self.quantile * (len(self.heights) - 1))))
+            return self.heights[index]
+        return self.heights[2]
+
+
+class WindowAggregate:
+    """Running min/max/mean/p95 for one series over one emit window."""
+
+    def __init__(self, capacity=EXACT_QUANTILE_SAMPLES):
+        self.samples = [0.0] * capacity
+        self.p95 = P2Quantile(0.95)
+        self.reset()
+
+    def reset(self):
+        self.count = 0
+        self.total = 0.0
+        self.minimum = None
+        self.maximum = None
+        self.p95.reset()
+
+    def add(self, value):
+        self.count += 1
+        self.total += value
+        if self.minimum is None or value < self.minimum:
+            self.minimum = value
+        if self.maximum is None or value > self.maximum:
+            self.maximum = value
+        capacity = len(self.samples)
+        if self.count <= capacity:
+            self.samples[self.count - 1] = value
+            return
+        if self.count == capacity + 1:
+            # The buffer is full: continue with a streaming estimate seeded from it
+            for sample in self.samples:
+                self.p95.add(sample)
+        self.p95.add(value)
+
+    def percentile(self):
+        """95th percentile of the window, exact while the samples fit the buffer."""
+        if self.count == 0:
+            return None
+        if self.count <= len(self.samples):
+            return exact_quantile(sorted(self.samples[:self.count]), 0.95)
+        return self.p95.value()
+
+    def summary(self):
+        if self.count == 0:
+            return {'min': None, 'max': None, 'mean': None, 'p95': None, 'samples': 0}
+        return {
+            'min': round(self.minimum, 2),
+            'max': round(self.maximum, 2),
+            'mean': round(self.total / self.count, 2),
+            'p95': round(self.percentile(), 2),
+            'samples': self.count
+        }
+
+
+# Series published per emit topic: topic -> series names
+BURST_SERIES = {
+    'cpu': ('usage',),
+    'memory': ('percent',),
+    'disk': ('read_rate', 'write_rate'),
+    'network': ('upload_rate', 'download_rate')
+}
+
+
+class BurstSampler:
+    """Background thread sampling /proc counters and aggregating per window."""
+
+    def __init__(self, hz=10, overhead_budget=DEFAULT_OVERHEAD_BUDGET, proc_root='/proc', sys_root='/sys'):
+        self.hz = float(hz)
+        self.overhead_budget = overhead_budget
+        self.proc_root = proc_root
+        self.sys_root = sys_root
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._fds = {}
+        self._disks = self._whole_disks()
+        self._aggregates = {
+            topic: {name: WindowAggregate() for name in names}
+            for topic, names in BURST_SERIES.items()
+        }
+        self._last = None
+        self._window_start = time.monotonic()
+        self._window_cpu = 0.0
+        self._last_window = None
+
+    # Whole block devices, so partitions are not counted twice
+    def _whole_disks(self):
+        try:
+            return {name for name in os.listdir(os.path.join(self.sys_root, 'block'))
+                    if not name.startswith(('loop', 'ram'))}
+        except OSError:
+            return None
+
+    # Re-read a /proc file through a descriptor that stays open between samples
+    def _read(self, name):
+        fd = self._fds.get(name)
+        if fd is None:
+            fd = os.open(os.path.join(self.proc_root, name), os.O_RDONLY)
+            self._fds[name] = fd
+        chunks = []
+        offset = 0
+        while True:
+            chunk = os.pread(fd, 65536, offset)
+            if not chunk:
+                break
+            chunks.append(chunk)
+            offset += len(chunk)
+        return b''.join(chunks)
+
+    def _read_counters(self):
+        counters = {}
+
+        # Aggregate CPU line: user nice system idle iowait irq softirq steal
+        stat = self._read('stat')
+        fields = stat[:stat.index(b'\n')].split()[1:9]
+        jiffies = [int(value) for value in fields]
+        counters['cpu_total'] = sum(jiffies)
+        counters['cpu_idle'] = jiffies[3] + (jiffies[4] if len(jiffies) > 4 else 0)
+
+        mem_total = mem_available = None
+        for line in self._read('meminfo').split(b'\n'):
+            if line.startswith(b'MemTotal:'):
+                mem_total = int(line.split()[1])
+            elif line.startswith(b'MemAvailable:'):
+                mem_available = int(line.split()[1])
+                break
+        if mem_total:
+            counters['mem_percent'] = (mem_total - (mem_available or 0)) / mem_total * 100
+
+        sectors_read = sectors_written = 0
+        for line in self._read('diskstats').split(b'\n'):
+            parts = line.split()
+            if len(parts) < 10:
+                continue
+            name = parts[2].decode()
+            if self._disks is not None and name not in self._disks:
+                continue
+            sectors_read += int(parts[5])
+            sectors_written += int(parts[9])
+        counters['disk_read'] = sectors_read * SECTOR_SIZE
+        counters['disk_write'] = sectors_written * SECTOR_SIZE
+
+        rx = tx = 0
+        for line in self._read('net/dev').split(b'\n')[2:]:
+            if b':' not in line:
+                continue
+            name, data = line.split(b':', 1)
+            if name.strip() == b'lo':
+                continue
+            parts = data.split()
+            rx += int(parts[0])
+            tx += int(parts[8])
+        counters['net_recv'] = rx
+        counters['net_sent'] = tx
+
+        return counters
+
+    # Turn two consecutive counter readings into one sample per series
+    def _fold(self, previous, current, elapsed):
+        aggregates = self._aggregates
+        cpu_total = current['cpu_total'] - previous['cpu_total']
+        if cpu_total > 0:
+            cpu_busy = cpu_total - (current['cpu_idle'] - previous['cpu_idle'])
+            aggregates['cpu']['usage'].add(cpu_busy / cpu_total * 100)
+        if 'mem_percent' in current:
+            aggregates['memory']['percent'].add(current['mem_percent'])
+        if elapsed > 0:
+            # Counters can go backwards when a device disappears; clamp to zero
+            aggregates['disk']['read_rate'].add(max(0, current['disk_read'] - previous['disk_read']) / elapsed)
+            aggregates['disk']['write_rate'].add(max(0, current['disk_write'] - previous['disk_write']) / elapsed)
+            aggregates['network']['upload_rate'].add(max(0, current['net_sent'] - previous['net_sent']) / elapsed)
+            aggregates['network']['download_rate'].add(max(0, current['net_recv'] - previous['net_recv']) / elapsed)
+
+    def sample(self):
+        """Take one sample and fold it into the current window."""
+        now = time.monotonic()
+        counters = self._read_counters()
+        with self._lock:
+            if self._last is not None:
+                last_time, last_counters = self._last
+                self._fold(last_counters, counters, now - last_time)
+            self._last = (now, counters)
+
+    def roll(self):
+        """Close the current window and return its aggregates."""
+        now = time.monotonic()
+        with self._lock:
+            elapsed = now - self._window_start
+            window = {
+                topic: {name: aggregate.summary() for name, aggregate in series.items()}
+                for topic, series in self._aggregates.items()
+            }
+            window['sampler'] = {
+                'hz': round(self.hz, 2),
+                'window_seconds': round(elapsed, 3),
+                'overhead_percent': round(self._window_cpu / elapsed * 100, 3) if elapsed > 0 else 0.0
+            }
+            for series in self._aggregates.values():
+                for aggregate in series.values():
+                    aggregate.reset()
+            self._window_start = now
+            self._window_cpu = 0.0
+            self._last_window = window
+        return window
+
+    def last_window(self):
+        """Aggregates of the most recently closed window, without rolling."""
+        with self._lock:
+            return self._last_window
+
+    def _run(self):
+        budget_start = time.monotonic()
+        budget_cpu = 0.0
+        next_tick = time.monotonic()
+        while not self._stop.is_set():
+            cpu_start = time.thread_time()
+            try:
+                self.sample()
+            except Exception as e:
+                logger.error(f"Burst sampler error: {str(e)}")
+                self._stop.wait(1)
+            cpu_used = time.thread_time() - cpu_start
+            budget_cpu += cpu_used
+            with self._lock:
+                self._window_cpu += cpu_used
+
+            # Every few seconds, slow down if our own CPU time exceeds the budget
+            now = time.monotonic()
+            if now - budget_start >= 5:
+                overhead = budget_cpu / (now - budget_start) * 100
+                if overhead > self.overhead_budget and self.hz > 1:
+                    self.hz = max(1.0, self.hz * self.overhead_budget / overhead)
+                    logger.warning(f"Burst sampler overhead {overhead:.2f}% of a core, lowering rate to {self.hz:.1f} Hz")
+                budget_start = now
+                budget_cpu = 0.0
+
+            next_tick += 1.0 / self.hz
+            delay = next_tick - time.monotonic()
+            if delay > 0:
+                self._stop.wait(delay)
+            else:
+                # Fell behind; resynchronise instead of sampling in a burst
+                next_tick = time.monotonic()
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='burst-sampler', daemon=True)
+            self._thread.start()
+            logger.info(f"Burst sampler started at {self.hz:.0f} Hz")
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+            self._thread = None
+        for fd in self._fds.values():
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+        self._fds = {}
@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+"""cgroup v2 resource accounting.
+
+Reads cpu.stat, memory.current/memory.stat, io.stat and pids.current for each
+cgroup under the unified hierarchy and turns them into per-cgroup and
+per-container usage. One small file per controller per cgroup is far cheaper
+than walking every PID, and it reflects the container limits that the
+host-wide numbers hide.
+
+The directory tree is only re-walked every `rescan_interval` seconds; between
+rescans the known cgroups are re-read and ones that disappeared are dropped.
+Container limits (memory.max, pids.max, cpu.max) are read once per rescan.
+The result keeps only the busiest cgroups and containers, so the snapshot
+stays small on hosts running thousands of containers; latest(full=True)
+returns every container.
+`root` can point at any directory laid out like cgroupfs, which makes the
+collector easy to exercise against a fake tree.
+"""
+import os
+import re
+import time
+import logging
+import threading
+
+logger = logging.getLogger('system_monitor')
+
+DEFAULT_CGROUP_ROOT = '/sys/fs/cgroup'
+
+# Container runtimes name their cgroups after the container ID
+CONTAINER_PATTERNS = (
+    ('docker', re.compile(r'(?:^|/)docker[-/]([0-9a-f]{12,64})(?:\.scope)?$')),
+    ('containerd', re.compile(r'(?:^|/)cri-containerd-([0-9a-f]{12,64})\.scope$')),
+    ('cri-o', re.compile(r'(?:^|/)crio-([0-9a-f]{12,64})\.scope$')),
+    ('podman', re.compile(r'(?:^|/)libpod-([0-9a-f]{12,64})\.scope$')),
+)
+
+# memory.stat keys worth surfacing in the breakdown
+MEMORY_STAT_KEYS = ('anon', 'file', 'kernel', 'shmem', 'sock')
+
+
+def _read_text(path):
+    with open(path, 'rb') as f:
+        return f.read().decode('ascii', 'replace')
+
+
+def _read_int(path):
+    """Read a single-value file; 'max' and missing files map to None."""
+    try:
+        value = _read_text(path).strip()
+    except (FileNotFoundError, PermissionError):
+        return None
+    if not value or value == 'max':
+        return None
+    return int(value)
+
+
+def _read_flat_keyed(path):
+    """Parse 'key value' lines such as cpu.stat and memory.stat."""
+    values = {}
+    try:
+        for line in _read_text(path).splitlines():
+            parts = line.split()
+            if len(parts) == 2:
+                values[parts[0]] = int(parts[1])
+    except (FileNotFoundError, PermissionError):
+        pass
+    return values
+
+
+def _read_io_stat(path):
+    """Sum io.stat counters ('8:0 rbytes=.. wbytes=.. rios=.. wios=..') over devices."""
+    totals = {'rbytes': 0, 'wbytes': 0, 'rios': 0, 'wios': 0}
+    try:
+        for line in _read_text(path).splitlines():
+            for field in line.split()[1:]:
+                key, _, value = field.partition('=')
+                if key in totals:
+                    totals[key] += int(value)
+    except (FileNotFoundError, PermissionError):
+        pass
+    return totals
+
+
+def _read_cpu_max(path):
+    """Return the CPU limit in cores from cpu.max ('quota period'), None if unlimited."""
+    try:
+        quota, period = _read_text(path).split()
+    except (FileNotFoundError, PermissionError, ValueError):
+        return None
+    if quota == 'max':
+        return None
+    return int(quota) / int(period)
+
+
+def container_for(path):
+    """Return (runtime, container_id) when a cgroup path belongs to a container."""
+    for runtime, pattern in CONTAINER_PATTERNS:
+        match = pattern.search(path)
+        if match:
+            return runtime, match.group(1)
+    return None
+
+
+class CgroupCollector:
+    """Incremental reader of every cgroup under a cgroup v2 mount."""
+
+    def __init__(self, root=DEFAULT_CGROUP_ROOT, rescan_interval=10, max_cgroups=5000, top_containers=50):
+        self.root = root
+        self.rescan_interval = rescan_interval
+        self.max_cgroups = max_cgroups
+        self.top_containers = top_containers
+        self._paths = []
+        self._last_scan = None
+        self._previous = {}
+        self._limits = {}
+        self._latest = None
+        self._all_containers = []
+        self._lock = threading.Lock()
+
+    def available(self):
+        """cgroup v2 exposes cgroup.controllers at the root of the hierarchy."""
+        return os.path.exists(os.path.join(self.root, 'cgroup.controllers'))
+
+    def _scan(self):
+        paths = []
+        stack = ['']
+        while stack and len(paths) < self.max_cgroups:
+            relative = stack.pop()
+            paths.append(relative)
+            try:
+                with os.scandir(os.path.join(self.root, relative)) as entries:
+                    for entry in entries:
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append(f"{relative}/{entry.name}" if relative else entry.name)
+            except (FileNotFoundError, PermissionError, NotADirectoryError):
+                continue
+        if stack:
+            logger.warning(f"More than {self.max_cgroups} cgroups under {self.root}, only the first {self.max_cgroups} are tracked")
+        self._paths = sorted(paths)
+        self._limits = {}
+        self._last_scan = time.monotonic()
+
+    def _read_cgroup(self, relative, full_stats):
+        directory = os.path.join(self.root, relative) if relative else self.root
+        cpu_stat = _read_flat_keyed(os.path.join(directory, 'cpu.stat'))
+        if not cpu_stat and not os.path.isdir(directory):
+            return None
+        stats = {
+            'cpu_usage_usec': cpu_stat.get('usage_usec', 0),
+            'cpu_user_usec': cpu_stat.get('user_usec', 0),
+            'cpu_system_usec': cpu_stat.get('system_usec', 0),
+            'nr_throttled': cpu_stat.get('nr_throttled', 0),
+            'throttled_usec': cpu_stat.get('throttled_usec', 0),
+            'memory_current': _read_int(os.path.join(directory, 'memory.current')),
+            'pids_current': _read_int(os.path.join(directory, 'pids.current')),
+            'io': _read_io_stat(os.path.join(directory, 'io.stat'))
+        }
+        if full_stats:
+            # Limits and memory.stat only matter for the per-container view;
+            # limits rarely change, so they are re-read on rescan only
+            limits = self._limits.get(relative)
+            if limits is None:
+                limits = self._limits[relative] = {
+                    'memory_max': _read_int(os.path.join(directory, 'memory.max')),
+                    'pids_max': _read_int(os.path.join(directory, 'pids.max')),
+                    'cpu_limit_cores': _read_cpu_max(os.path.join(directory, 'cpu.max'))
+                }
+            stats.update(limits)
+            memory_stat = _read_flat_keyed(os.path.join(directory, 'memory.stat'))
+            stats['memory_stat'] = {key: memory_stat[key] for key in MEMORY_STAT_KEYS if key in memory_stat}
+        return stats
+
+    def _usage(self, relative, stats, previous, elapsed):
+        usage = {
+            'path': '/' + relative,
+            'cpu_percent': 0.0,
+            'cpu_throttled_count': stats['nr_throttled'],
+            'memory_bytes': stats['memory_current'],
+            'pids': stats['pids_current'],
+            'io_read_rate': 0.0,
+            'io_write_rate': 0.0,
+            'io_read_bytes': stats['io']['rbytes'],
+            'io_write_bytes': stats['io']['wbytes']
+        }
+        if previous and elapsed > 0:
+            # Percent of one core; counters reset if the cgroup was recreated
+            cpu_delta = stats['cpu_usage_usec'] - previous['cpu_usage_usec']
+            if cpu_delta >= 0:
+                usage['cpu_percent'] = round(cpu_delta / (elapsed * 1e6) * 100, 2)
+            read_delta = stats['io']['rbytes'] - previous['io']['rbytes']
+            write_delta = stats['io']['wbytes'] - previous['io']['wbytes']
+            usage['io_read_rate'] = max(0, read_delta) / elapsed
+            usage['io_write_rate'] = max(0, write_delta) / elapsed
+        return usage
+
+    def latest(self, full=False):
+        """Result of the last collect(), so readers do not shorten its rate window.
+
+        With full=True the result lists every container instead of the busiest.
+        """
+        with self._lock:
+            latest = self._latest
+            containers = self._all_containers
+        if latest is None:
+            latest = self.collect()
+            with self._lock:
+                containers = self._all_containers
+        if full and latest.get('available'):
+            return dict(latest, containers=containers)
+        return latest
+
+    def collect(self, top=100):
+        """Read all known cgroups and return the per-cgroup and per-container breakdown."""
+        with self._lock:
+            self._latest = self._collect(top)
+            return self._latest
+
+    def _collect(self, top):
+        if not self.available():
+            return {'available': False, 'root': self.root}
+
+        now = time.monotonic()
+        if self._last_scan is None or now - self._last_scan >= self.rescan_interval:
+            self._scan()
+
+        current = {}
+        cgroups = []
+        containers = []
+        for relative in self._paths:
+            container = container_for(relative)
+            try:
+                stats = self._read_cgroup(relative, full_stats=container is not None)
+            except (OSError, ValueError) as e:
+                logger.debug(f"Could not read cgroup {relative}: {str(e)}")
+                continue
+            if stats is None:
+                # Removed since the last scan
+                continue
+
+            previous = self._previous.get(relative)
+            elapsed = now - previous[0] if previous else 0
+            usage = self._usage(relative, stats, previous[1] if previous else None, elapsed)
+            current[relative] = (now, stats)
+            cgroups.append(usage)
+
+            if container:
+                runtime, container_id = container
+                usage = dict(usage)
+                usage['runtime'] = runtime
+                usage['id'] = container_id[:12]
+                usage['memory_limit_bytes'] = stats['memory_max']
+                usage['pids_limit'] = stats['pids_max']
+                usage['cpu_limit_cores'] = stats['cpu_limit_cores']
+                usage['memory_stat'] = stats['memory_stat']
+                if stats['memory_max'] and stats['memory_current'] is not None:
+                    usage['memory_percent'] = round(stats['memory_current'] / stats['memory_max'] * 100, 2)
+                containers.append(usage)
+
+        # Forget cgroups that no longer exist so state does not grow without bound
+        self._previous = current
+        for relative in set(self._limits) - set(current):
+            del self._limits[relative]
+
+        cgroups.sort(key=lambda x: x['cpu_percent'], reverse=True)
+        containers.sort(key=lambda x: x['cpu_percent'], reverse=True)
+        self._all_containers = containers
+        return {
+            'available': True,
+            'root': self.root,
+            'cgroup_count': len(current),
+            'container_count': len(containers),
+            'containers': containers[:self.top_containers],  # Limit to the busiest containers
+            'cgroups': cgroups[:top]  # Limit to the busiest cgroups
+        }
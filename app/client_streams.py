@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""Per-client backpressure for Socket.IO snapshot delivery.
+
+Broadcasting every topic to every client on each tick lets a slow consumer
+(a throttled background tab, a slow VPN) build up an unbounded backlog of
+stale frames in server memory. Instead, each client gets a send slot per
+topic holding only the latest frame; a newer frame replaces a pending one
+(counted as dropped). A batch is sent only after the client acknowledged the
+previous one, and the minimum gap between batches follows the client's
+acknowledgement round-trip time. Memory per client is bounded by the number
+of topics, no matter how slow the client is.
+"""
+import time
+import logging
+import threading
+
+logger = logging.getLogger('system_monitor')
+
+# Smoothing factor for the round-trip time moving average
+RTT_ALPHA = 0.3
+
+
+class ClientStream:
+    """Send state for one connected client."""
+
+    def __init__(self, sid):
+        self.sid = sid
+        self.pending = {}
+        self.in_flight = False
+        self.batch = 0
+        self.sent_at = None
+        self.last_sent = 0.0
+        self.rtt = None
+        self.interval = 0.0
+        self.frames_sent = 0
+        self.frames_dropped = 0
+        self.ack_timeouts = 0
+
+    def stats(self):
+        return {
+            'sid': self.sid[:8],
+            'interval': round(self.interval, 3),
+            'rtt_ms': round(self.rtt * 1000, 1) if self.rtt is not None else None,
+            'in_flight': self.in_flight,
+            'pending': len(self.pending),
+            'frames_sent': self.frames_sent,
+            'frames_dropped': self.frames_dropped,
+            'ack_timeouts': self.ack_timeouts
+        }
+
+
+class ClientStreamManager:
+    """Coalesces frames per client and paces sends by acknowledgements."""
+
+    def __init__(self, emit, topics, min_interval=0.0, max_interval=30.0, rtt_factor=2.0, ack_timeout=15.0):
+        self.emit = emit
+        self.topics = tuple(topics)
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.rtt_factor = rtt_factor
+        self.ack_timeout = ack_timeout
+        self._clients = {}
+        self._lock = threading.Lock()
+        self._timer = None
+        self._timer_due = None
+        self.sent_from_closed = 0
+        self.dropped_from_closed = 0
+
+    def add(self, sid):
+        with self._lock:
+            self._clients[sid] = ClientStream(sid)
+
+    def remove(self, sid):
+        with self._lock:
+            client = self._clients.pop(sid, None)
+            if client:
+                # Keep totals monotonic when clients disconnect
+                self.sent_from_closed += client.frames_sent
+                self.dropped_from_closed += client.frames_dropped + len(client.pending)
+
+    def publish(self, snapshot, sid=None):
+        """Queue a snapshot for every client (or one), replacing superseded frames."""
+        with self._lock:
+            if sid is None:
+                clients = list(self._clients.values())
+            else:
+                clients = [self._clients[sid]] if sid in self._clients else []
+            for client in clients:
+                for topic in self.topics:
+                    if topic in snapshot:
+                        if topic in client.pending:
+                            client.frames_dropped += 1
+                        client.pending[topic] = snapshot[topic]
+        for client in clients:
+            self._flush(client)
+
+    def _flush(self, client):
+        now = time.monotonic()
+        with self._lock:
+            if client.sid not in self._clients or not client.pending:
+                return
+            if client.in_flight:
+                if now - client.sent_at < self.ack_timeout:
+                    return
+                # No acknowledgement: assume it was lost (or the client does not ack) and slow down
+                client.ack_timeouts += 1
+                client.in_flight = False
+                client.interval = min(self.max_interval, max(client.interval * 2, self.ack_timeout))
+            wait = client.last_sent + client.interval - now
+            if wait > 0:
+                self._schedule(wait)
+                return
+            frames = [(topic, client.pending[topic]) for topic in self.topics if topic in client.pending]
+            client.pending = {}
+            client.in_flight = True
+            client.batch += 1
+            batch = client.batch
+            client.sent_at = now
+            client.last_sent = now
+            client.frames_sent += len(frames)
+
+        # Acknowledge on the last frame of the batch; Socket.IO keeps per-client ordering
+        for index, (topic, payload) in enumerate(frames):
+            if index == len(frames) - 1:
+                self.emit(topic, payload, to=client.sid, callback=lambda *args: self._acked(client, batch))
+            else:
+                self.emit(topic, payload, to=client.sid)
+
+    def _acked(self, client, batch):
+        now = time.monotonic()
+        with self._lock:
+            if not client.in_flight or batch != client.batch:
+                # A late ack for a batch given up on after ack_timeout; timing
+                # it against the current batch would corrupt the RTT
+                return
+            rtt = now - client.sent_at
+            client.rtt = rtt if client.rtt is None else RTT_ALPHA * rtt + (1 - RTT_ALPHA) * client.rtt
+            client.interval = max(self.min_interval, min(self.max_interval, client.rtt * self.rtt_factor))
+            client.in_flight = False
+        self._flush(client)
+
+    def _schedule(self, delay):
+        """Retry deferred flushes once the earliest client interval has passed."""
+        due = time.monotonic() + delay
+        if self._timer is not None and self._timer.is_alive():
+            if self._timer_due <= due:
+                return
+            self._timer.cancel()
+        self._timer_due = due
+        self._timer = threading.Timer(delay, self._flush_all)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _flush_all(self):
+        with self._lock:
+            # This runs on the timer thread; drop it first so a flush that is
+            # still too early can schedule a new timer instead of waiting on this one
+            if self._timer is threading.current_thread():
+                self._timer = None
+            clients = list(self._clients.values())
+        for client in clients:
+            self._flush(client)
+
+    def stats(self):
+        with self._lock:
+            clients = [client.stats() for client in self._clients.values()]
+        return {
+            'clients': clients,
+            'frames_sent': sum(client['frames_sent'] for client in clients) + self.sent_from_closed,
+            'frames_dropped': sum(client['frames_dropped'] for client in clients) + self.dropped_from_closed
+        }
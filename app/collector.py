@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""Standalone collector process.
+
+Samples the host once per interval and publishes the snapshot into shared
+memory, so every web worker serves the same numbers and collection cost does
+not grow with the number of workers.
+
+Run it next to web workers started with COLLECTOR_MODE=attach:
+
+    python app/collector.py
+"""
+import os
+import time
+import signal
+import logging
+import multiprocessing
+
+from snapshot_store import SnapshotWriter
+
+logger = logging.getLogger('system_monitor')
+
+
+# Collect and publish snapshots until terminated, or until the parent web
+# process goes away when running as its child
+def run_collector(snapshot_fn, shm_name, interval):
+    writer = SnapshotWriter(name=shm_name)
+    logger.info(f"Collector publishing snapshots to shared memory '{writer.name}' every {interval}s")
+    parent_pid = os.getppid() if multiprocessing.parent_process() else None
+
+    def handle_term(signum, frame):
+        raise SystemExit(0)
+
+    signal.signal(signal.SIGTERM, handle_term)
+    try:
+        while True:
+            if parent_pid is not None and os.getppid() != parent_pid:
+                logger.warning(f"Parent process {parent_pid} exited, stopping collector")
+                break
+            started = time.monotonic()
+            try:
+                writer.publish(snapshot_fn())
+            except Exception as e:
+                logger.error(f"Error in collector: {str(e)}")
+            time.sleep(max(0, interval - (time.monotonic() - started)))
+    except (KeyboardInterrupt, SystemExit):
+        pass
+    finally:
+        writer.close()
+        logger.info("Collector stopped")
+
+
+# Start the collector as a child process of the web server
+def start_collector_process(target):
+    process = multiprocessing.Process(target=target, name='system-monitor-collector', daemon=True)
+    process.start()
+    logger.info(f"Collector process started (pid {process.pid})")
+    return process
+
+
+if __name__ == '__main__':
+    from app import collector_main
+    collector_main()
@@ -0,0 +1,414 @@
+#!/usr/bin/env python3
+"""Recording and replay of snapshot streams.
+
+A recording is an append-only file of NDJSON records:
+
+    {"t": 1700000000.0, "k": 1, "d": {...full snapshot...}}   keyframe
+    {"t": 1700000002.0, "d": {...changes since previous...}}  delta
+
+Deltas are recursive dict diffs: changed values are stored as-is, nested
+dicts are diffed, and removed keys are listed under "$del". A keyframe is
+written every `keyframe_interval` records and whenever a file is reopened.
+
+Each keyframe starts a new gzip member that holds it and the deltas after
+it, so the deltas compress against each other. Every record is sync-flushed,
+which lets a reader decode it while the member is still open. The keyframe's
+timestamp and byte offset are appended to a sidecar index ("<path>.idx"),
+so a reader can seek by decoding from the nearest keyframe instead of from
+the start. Concatenated gzip members are a valid gzip stream, so
+`zcat recording.ndjson.gz` works too.
+
+A member left open by a crash is finished by the next writer that opens the
+file, dropping a torn last record. Readers skip undecodable data up to the
+next indexed keyframe.
+
+Everything is read and written incrementally; a recording never has to fit
+in memory.
+"""
+import os
+import json
+import time
+import zlib
+import bisect
+import logging
+import threading
+
+logger = logging.getLogger('system_monitor')
+
+DELETED = '$del'
+READ_CHUNK = 64 * 1024
+
+
+# Recursive dict diff; lists and scalars are replaced wholesale
+def diff(old, new):
+    delta = {}
+    for key, value in new.items():
+        previous = old.get(key, DELETED)
+        if isinstance(value, dict) and isinstance(previous, dict):
+            nested = diff(previous, value)
+            if nested:
+                delta[key] = nested
+        elif previous != value or key not in old:
+            delta[key] = value
+    removed = [key for key in old if key not in new]
+    if removed:
+        delta[DELETED] = removed
+    return delta
+
+
+# Apply a delta produced by diff() to a copy of base
+def patch(base, delta):
+    result = dict(base)
+    for key in delta.get(DELETED, ()):
+        result.pop(key, None)
+    for key, value in delta.items():
+        if key == DELETED:
+            continue
+        if isinstance(value, dict) and isinstance(result.get(key), dict):
+            result[key] = patch(result[key], value)
+        else:
+            result[key] = value
+    return result
+
+
+def index_path(path):
+    return path + '.idx'
+
+
+# Decompress a chunk; on corrupt input, return what decoded before the bad byte
+def _inflate(decompressor, data):
+    backup = decompressor.copy()
+    try:
+        return decompressor.decompress(data), True
+    except zlib.error:
+        pass
+    output = b''
+    for position in range(len(data)):
+        try:
+            output += backup.decompress(data[position:position + 1])
+        except zlib.error:
+            break
+    return output, False
+
+
+class RecordingWriter:
+    """Appends snapshots to a recording file."""
+
+    def __init__(self, path, keyframe_interval=30, compress_level=6):
+        self.path = path
+        self.keyframe_interval = keyframe_interval
+        self.compress_level = compress_level
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._recover()
+        self._file = open(path, 'ab')
+        self._index = open(index_path(path), 'a')
+        self._compressor = None
+        self._previous = None
+        self._since_keyframe = 0
+        self._lock = threading.Lock()
+
+    def append(self, snapshot, timestamp=None):
+        timestamp = time.time() if timestamp is None else timestamp
+        with self._lock:
+            keyframe = self._previous is None or self._since_keyframe >= self.keyframe_interval
+            # Diff the JSON round-tripped form, which is what a reader rebuilds
+            full = json.loads(json.dumps(snapshot, default=str))
+            if keyframe:
+                record = {'t': timestamp, 'k': 1, 'd': full}
+                self._since_keyframe = 0
+            else:
+                record = {'t': timestamp, 'd': diff(self._previous, full)}
+            self._since_keyframe += 1
+            self._previous = full
+            line = json.dumps(record, separators=(',', ':'))
+
+            if keyframe:
+                # Finish the previous segment; the keyframe starts a member that can be seeked to
+                if self._compressor is not None:
+                    self._file.write(self._compressor.flush())
+                self._compressor = zlib.compressobj(self.compress_level, zlib.DEFLATED, 31)
+                offset = self._file.tell()
+            self._file.write(self._compressor.compress((line + '\n').encode('utf-8')))
+            self._file.write(self._compressor.flush(zlib.Z_SYNC_FLUSH))
+            self._file.flush()
+            if keyframe:
+                self._index.write(json.dumps({'t': timestamp, 'o': offset}) + '\n')
+                self._index.flush()
+
+    def _recover(self):
+        """Finish a member left open by a crash so that later members stay decodable.
+
+        The complete records of the open member are rewritten as a finished
+        member at the same offset; a torn last record is dropped. The index is
+        rewritten to match.
+        """
+        if not os.path.exists(self.path) or os.path.getsize(self.path) == 0:
+            return
+        times, offsets = RecordingReader(self.path).keyframes()
+        entries = list(zip(times, offsets))
+        position = offsets[-1] if offsets else 0
+        with open(self.path, 'rb') as f:
+            f.seek(position)
+            data = f.read()
+
+        # Members after the last indexed keyframe are whole except possibly the last one
+        lines = []
+        finished = True
+        while data:
+            decompressor = zlib.decompressobj(31)
+            output, _ = _inflate(decompressor, data)
+            lines = []
+            for line in output.split(b'\n')[:-1]:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break
+                if not lines and record.get('k') and position not in offsets:
+                    entries.append((record['t'], position))
+                lines.append(line)
+            if not decompressor.eof:
+                finished = False
+                break
+            position += len(data) - len(decompressor.unused_data)
+            data = decompressor.unused_data
+
+        if not finished:
+            with open(self.path, 'r+b') as f:
+                f.truncate(position)
+                if lines:
+                    f.seek(position)
+                    compressor = zlib.compressobj(self.compress_level, zlib.DEFLATED, 31)
+                    f.write(compressor.compress(b''.join(line + b'\n' for line in lines)) + compressor.flush())
+            entries = [(t, o) for t, o in entries if o < position or (o == position and lines)]
+            logger.info(f"Finished an interrupted segment of {self.path} ({len(lines)} records kept)")
+        elif len(entries) == len(offsets) and os.path.exists(index_path(self.path)):
+            return
+
+        temporary = index_path(self.path) + '.tmp'
+        with open(temporary, 'w') as f:
+            for t, o in entries:
+                f.write(json.dumps({'t': t, 'o': o}) + '\n')
+        os.replace(temporary, index_path(self.path))
+
+    def close(self):
+        with self._lock:
+            if self._compressor is not None:
+                self._file.write(self._compressor.flush())
+                self._compressor = None
+            self._file.close()
+            self._index.close()
+
+
+class RecordingReader:
+    """Decodes a recording, optionally starting from a point in time."""
+
+    def __init__(self, path):
+        self.path = path
+
+    def _indexed_keyframes(self):
+        """(timestamps, offsets) from the index file, or None if there is none."""
+        times, offsets = [], []
+        try:
+            with open(index_path(self.path)) as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # Partially written last line
+                        break
+                    times.append(entry['t'])
+                    offsets.append(entry['o'])
+        except FileNotFoundError:
+            return None
+        return times, offsets
+
+    def keyframes(self):
+        """(timestamps, offsets) of all keyframes, rebuilding the index if it is missing."""
+        indexed = self._indexed_keyframes()
+        if indexed is not None:
+            return indexed
+        times, offsets = [], []
+        for offset, record in self._raw_records(0):
+            if record.get('k'):
+                times.append(record['t'])
+                offsets.append(offset)
+        return times, offsets
+
+    def _next_keyframe(self, offset):
+        """Offset of the first indexed keyframe after offset, or None."""
+        indexed = self._indexed_keyframes()
+        if indexed is None:
+            return None
+        offsets = indexed[1]
+        position = bisect.bisect_right(offsets, offset)
+        return offsets[position] if position < len(offsets) else None
+
+    def _raw_records(self, offset):
+        """Yield (member offset, record) from a byte offset that starts a gzip member.
+
+        A record is yielded as soon as its line is complete, so the member a
+        live writer is still appending to is read up to its last record.
+        """
+        with open(self.path, 'rb') as f:
+            f.seek(offset)
+            member_offset = position = offset
+            decompressor = zlib.decompressobj(31)
+            pending = b''
+            while True:
+                data = f.read(READ_CHUNK)
+                if not data:
+                    return
+                while data:
+                    output, valid = _inflate(decompressor, data)
+                    lines = (pending + output).split(b'\n')
+                    pending = lines.pop()
+                    for line in lines:
+                        if not line:
+                            continue
+                        try:
+                            record = json.loads(line)
+                        except ValueError:
+                            valid = False
+                            break
+                        yield member_offset, record
+                    if not valid:
+                        # Torn by a crash: resume at the next keyframe, if any
+                        resume = self._next_keyframe(member_offset)
+                        if resume is None:
+                            logger.warning(f"Undecodable data at offset {member_offset} of {self.path}")
+                            return
+                        logger.warning(f"Skipping undecodable data in {self.path} from offset {member_offset} to {resume}")
+                        f.seek(resume)
+                        member_offset = position = resume
+                        decompressor = zlib.decompressobj(31)
+                        pending = b''
+                        break
+                    if not decompressor.eof:
+                        position += len(data)
+                        break
+                    position += len(data) - len(decompressor.unused_data)
+                    member_offset = position
+                    data = decompressor.unused_data
+                    decompressor = zlib.decompressobj(31)
+                    pending = b''
+
+    def records(self, start=None, end=None):
+        """Yield (timestamp, full snapshot) for records with start <= t <= end."""
+        offset = 0
+        if start is not None:
+            times, offsets = self.keyframes()
+            position = bisect.bisect_right(times, start) - 1
+            if position >= 0:
+                offset = offsets[position]
+        state = None
+        for _, record in self._raw_records(offset):
+            if record.get('k'):
+                state = record['d']
+            elif state is None:
+                # Deltas before the first keyframe cannot be reconstructed
+                continue
+            else:
+                state = patch(state, record['d'])
+            timestamp = record['t']
+            if start is not None and timestamp < start:
+                continue
+            if end is not None and timestamp > end:
+                return
+            yield timestamp, state
+
+    def iter_bytes(self):
+        """Stream the raw (gzip) recording in chunks."""
+        with open(self.path, 'rb') as f:
+            while True:
+                chunk = f.read(READ_CHUNK)
+                if not chunk:
+                    return
+                yield chunk
+
+    def iter_ndjson(self, start=None, end=None):
+        """Stream decoded full snapshots as NDJSON lines."""
+        for timestamp, snapshot in self.records(start, end):
+            yield json.dumps({'t': timestamp, 'd': snapshot}, separators=(',', ':')) + '\n'
+
+    def time_range(self):
+        """(first, last) timestamps in the recording, or (None, None) if it is empty."""
+        times, offsets = self.keyframes()
+        if not times:
+            return None, None
+        last = times[-1]
+        for _, record in self._raw_records(offsets[-1]):
+            last = record['t']
+        return times[0], last
+
+
+class Replayer:
+    """Paces a recording back out in (sped-up) real time, with seek."""
+
+    MIN_SPEED = 1.0
+    MAX_SPEED = 100.0
+
+    def __init__(self, path, speed=1.0):
+        self.reader = RecordingReader(path)
+        self.speed = self._clamp(speed)
+        self.position = None
+        self.current = None
+        self._seek_to = None
+        self._lock = threading.Lock()
+        self._changed = threading.Event()
+        self.start, self.end = self.reader.time_range()
+
+    def _clamp(self, speed):
+        return max(self.MIN_SPEED, min(self.MAX_SPEED, float(speed)))
+
+    def set_speed(self, speed):
+        with self._lock:
+            self.speed = self._clamp(speed)
+        self._changed.set()
+
+    def seek(self, timestamp):
+        with self._lock:
+            self._seek_to = float(timestamp)
+        self._changed.set()
+
+    def status(self):
+        return {
+            'position': self.position,
+            'start': self.start,
+            'end': self.end,
+            'speed': self.speed
+        }
+
+    def frames(self):
+        """Yield snapshots at the recorded cadence divided by the speed; never returns."""
+        start = self.start
+        while True:
+            with self._lock:
+                if self._seek_to is not None:
+                    start, self._seek_to = self._seek_to, None
+            self._changed.clear()
+            previous = None
+            interrupted = False
+            for timestamp, snapshot in self.reader.records(start=start):
+                if previous is not None:
+                    # Sleep the scaled gap; a seek or speed change wakes us early
+                    deadline = time.monotonic() + (timestamp - previous) / self.speed
+                    while not interrupted:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            break
+                        if self._changed.wait(min(remaining, 0.5)):
+                            self._changed.clear()
+                            interrupted = self._seek_to is not None
+                if interrupted:
+                    break
+                previous = timestamp
+                self.position = timestamp
+                self.current = snapshot
+                yield snapshot
+            if not interrupted:
+                # End of recording: hold the last frame until someone seeks
+                while self._seek_to is None:
+                    self._changed.wait()
+                    self._changed.clear()
+                self.start, self.end = self.reader.time_range()
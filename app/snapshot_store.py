@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+"""Publish metric snapshots through shared memory.
+
+A single collector process writes each snapshot into a
+multiprocessing.shared_memory segment; any number of web workers read the
+latest one without locks or IPC round trips.
+
+Layout (little endian):
+
+    header   generation u64     number of snapshots published so far
+             instance   u64     random ID of the writer that created the segment
+             pid        u32     process ID of that writer
+             closed     u8      set when the writer shut down cleanly
+    slot[i]  sequence   u64     odd while the writer is filling the slot
+             length     u32     size of the JSON payload in bytes
+             payload    bytes   UTF-8 JSON, up to slot_size bytes
+
+The writer alternates between two slots (double buffer) and guards each one
+with a seqlock: it makes the slot's sequence odd, writes the payload, makes
+it even again, then bumps the generation so readers switch to the new slot.
+A reader copies the slot named by the generation and retries only if the
+slot's sequence changed underneath it, which needs the writer to lap both
+slots during a single copy.
+
+A restarted collector creates a new segment under the same name, while
+readers still hold the old mapping. Readers re-attach when the old writer
+marked its segment closed, or when no new snapshot arrived for a while and
+the name now belongs to a different writer instance. A writer refuses to take
+over a segment whose owner is still running.
+"""
+import os
+import json
+import time
+import struct
+import logging
+import threading
+from multiprocessing import shared_memory
+
+logger = logging.getLogger('system_monitor')
+
+DEFAULT_SHM_NAME = 'system_monitor_snapshot'
+DEFAULT_SLOT_SIZE = 4 * 1024 * 1024
+
+_GENERATION = struct.Struct('<Q')
+_OWNER = struct.Struct('<QIB')  # instance, pid, closed; follows the generation
+_SLOT_HEADER = struct.Struct('<QI')
+_HEADER_SIZE = 64  # generation, owner and padding
+_MAX_READ_ATTEMPTS = 100
+
+# Seconds without a new generation before a reader checks for a restarted writer
+DEFAULT_RECHECK_INTERVAL = 5.0
+
+
+def _slot_offset(slot, slot_size):
+    return _HEADER_SIZE + slot * (_SLOT_HEADER.size + slot_size)
+
+
+def _open_existing(name):
+    """Attach to a segment without letting this process unlink it at exit."""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # Python < 3.13 always registers with the resource tracker
+        shm = shared_memory.SharedMemory(name=name)
+        from multiprocessing import resource_tracker
+        resource_tracker.unregister(shm._name, 'shared_memory')
+        return shm
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class SnapshotWriter:
+    """Single writer that owns the shared memory segment."""
+
+    def __init__(self, name=DEFAULT_SHM_NAME, slot_size=DEFAULT_SLOT_SIZE, takeover_timeout=5.0):
+        self.slot_size = slot_size
+        size = _HEADER_SIZE + 2 * (_SLOT_HEADER.size + slot_size)
+        try:
+            self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        except FileExistsError:
+            existing = _open_existing(name)
+            try:
+                _, pid, closed = _OWNER.unpack_from(existing.buf, _GENERATION.size)
+            finally:
+                existing.close()
+            # A collector being replaced gets a moment to exit on its own
+            deadline = time.monotonic() + takeover_timeout
+            while not closed and pid != os.getpid() and _pid_alive(pid):
+                if time.monotonic() >= deadline:
+                    raise RuntimeError(f"Shared memory '{name}' is in use by a running collector (pid {pid})")
+                time.sleep(0.1)
+            # Left behind by a collector that did not shut down cleanly
+            try:
+                shared_memory.SharedMemory(name=name).unlink()
+            except FileNotFoundError:
+                pass
+            self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        self.name = self.shm.name
+        self.generation = 0
+        self.instance = int.from_bytes(os.urandom(8), 'little')
+        _GENERATION.pack_into(self.shm.buf, 0, 0)
+        _OWNER.pack_into(self.shm.buf, _GENERATION.size, self.instance, os.getpid(), 0)
+
+    def publish(self, snapshot):
+        """Serialise a snapshot and make it the latest one. Returns its generation."""
+        data = json.dumps(snapshot, separators=(',', ':'), default=str).encode('utf-8')
+        if len(data) > self.slot_size:
+            logger.error(f"Snapshot of {len(data)} bytes exceeds shared memory slot of {self.slot_size} bytes, dropped")
+            return None
+
+        buf = self.shm.buf
+        generation = self.generation + 1
+        offset = _slot_offset(generation % 2, self.slot_size)
+        sequence, _ = _SLOT_HEADER.unpack_from(buf, offset)
+
+        _SLOT_HEADER.pack_into(buf, offset, sequence + 1, len(data))
+        start = offset + _SLOT_HEADER.size
+        buf[start:start + len(data)] = data
+        _SLOT_HEADER.pack_into(buf, offset, sequence + 2, len(data))
+
+        _GENERATION.pack_into(buf, 0, generation)
+        self.generation = generation
+        return generation
+
+    def close(self):
+        # Tell attached readers to look for a new segment
+        _OWNER.pack_into(self.shm.buf, _GENERATION.size, self.instance, os.getpid(), 1)
+        self.shm.close()
+        try:
+            self.shm.unlink()
+        except FileNotFoundError:
+            pass
+
+
+class SnapshotReader:
+    """Reader attached to a segment created by a SnapshotWriter."""
+
+    def __init__(self, name=DEFAULT_SHM_NAME, recheck_interval=DEFAULT_RECHECK_INTERVAL):
+        self.name = name
+        self.recheck_interval = recheck_interval
+        self.shm = None
+        self.instance = None
+        self._lock = threading.Lock()
+        self._last_generation = 0
+        self._last_change = time.monotonic()
+        self._cache = None
+
+    def _attach(self):
+        with self._lock:
+            if self.shm is not None and self._writer_replaced():
+                logger.info(f"Collector restarted, re-attaching to shared memory '{self.name}'")
+                try:
+                    self.shm.close()
+                except BufferError:
+                    # Another thread is still copying from the old mapping
+                    pass
+                self.shm = None
+            if self.shm is None:
+                # Readers must not unlink the writer's segment when they exit
+                try:
+                    self.shm = _open_existing(self.name)
+                except FileNotFoundError:
+                    return False
+                self.instance = _OWNER.unpack_from(self.shm.buf, _GENERATION.size)[0]
+                self.slot_size = (self.shm.size - _HEADER_SIZE) // 2 - _SLOT_HEADER.size
+                self._last_change = time.monotonic()
+        return True
+
+    def _writer_replaced(self):
+        """True when the attached segment was closed or superseded by a new writer."""
+        if _OWNER.unpack_from(self.shm.buf, _GENERATION.size)[2]:
+            return True
+        generation, = _GENERATION.unpack_from(self.shm.buf, 0)
+        now = time.monotonic()
+        if generation != self._last_generation:
+            self._last_generation = generation
+            self._last_change = now
+            return False
+        if now - self._last_change < self.recheck_interval:
+            return False
+        # No new snapshot for a while: see whether the name points elsewhere now
+        self._last_change = now
+        try:
+            current = _open_existing(self.name)
+        except FileNotFoundError:
+            return False
+        try:
+            return _OWNER.unpack_from(current.buf, _GENERATION.size)[0] != self.instance
+        finally:
+            current.close()
+
+    def read_bytes(self):
+        """Return (generation, payload bytes) of the latest snapshot, or (0, None)."""
+        if not self._attach():
+            return 0, None
+
+        buf = self.shm.buf
+        for _ in range(_MAX_READ_ATTEMPTS):
+            generation, = _GENERATION.unpack_from(buf, 0)
+            if generation == 0:
+                return 0, None
+            offset = _slot_offset(generation % 2, self.slot_size)
+            sequence, length = _SLOT_HEADER.unpack_from(buf, offset)
+            if sequence % 2:
+                continue
+            start = offset + _SLOT_HEADER.size
+            data = bytes(buf[start:start + length])
+            if _SLOT_HEADER.unpack_from(buf, offset)[0] == sequence:
+                return generation, data
+            time.sleep(0)
+        logger.warning("Could not read a consistent snapshot from shared memory")
+        return 0, None
+
+    def read(self):
+        """Return (generation, snapshot dict) of the latest snapshot, or (0, None).
+
+        The snapshot is decoded once per generation and shared by all callers,
+        so treat it as read-only.
+        """
+        if not self._attach():
+            return 0, None
+        generation, = _GENERATION.unpack_from(self.shm.buf, 0)
+        cache = self._cache
+        if cache is not None and cache[0] == (self.instance, generation):
+            return generation, cache[1]
+        generation, data = self.read_bytes()
+        if data is None:
+            return 0, None
+        snapshot = json.loads(data)
+        self._cache = ((self.instance, generation), snapshot)
+        return generation, snapshot
+
+    def close(self):
+        if self.shm is not None:
+            self.shm.close()
+            self.shm = None
@@ -272,6 +272,20 @@ function updateWeatherInfo(data) {
     }
 }
 
+// Listen for a snapshot event and acknowledge it, so the server sends the
+// next batch only once this one has been handled
+function onFrame(event, handler) {
+    socket.on(event, (data, ack) => {
+        try {
+            handler(data);
+        } finally {
+            if (typeof ack === 'function') {
+                ack();
+            }
+        }
+    });
+}
+
 // Set up Socket.IO event listeners
 function setupSocketEvents() {
     socket.on('connect', () => {
@@ -289,14 +303,14 @@ function setupSocketEvents() {
     });
     
     // System info updates
-    socket.on('system_info', (data) => {
+    onFrame('system_info', (data) => {
         updateSystemInfo(data);
         // Also update health since it's related
         loadHealthStatus();
     });
     
     // CPU updates
-    socket.on('cpu_info', (data) => {
+    onFrame('cpu_info', (data) => {
         updateCPUInfo(data);
         updateCPUHeatmap(data);
         
@@ -319,7 +333,7 @@ function setupSocketEvents() {
     });
     
     // Memory updates
-    socket.on('memory_info', (data) => {
+    onFrame('memory_info', (data) => {
         updateMemoryInfo(data);
         
         // Only update chart data if we're using charts
@@ -338,22 +352,25 @@ function setupSocketEvents() {
     });
     
     // Disk updates
-    socket.on('disk_info', (data) => {
+    onFrame('disk_info', (data) => {
         updateDiskInfo(data);
     });
     
     // Network updates
-    socket.on('network_info', (data) => {
+    onFrame('network_info', (data) => {
         updateNetworkInfo(data);
     });
     
     // Process updates
-    socket.on('process_info', (data) => {
+    onFrame('process_info', (data) => {
         if (data && data.processes) {
             updateProcessTable(data.processes);
         }
     });
     
+    // Events without a dedicated view still need to be acknowledged
+    ['cgroup_info', 'alert_info', 'replay_info', 'timestamp'].forEach((event) => onFrame(event, () => {}));
+    
     // Get regular data updates
     setInterval(() => {
         socket.emit('get_data');
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The app modules are imported as top-level modules, as when running app/app.py
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'app'))
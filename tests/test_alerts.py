@@ -0,0 +1,200 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import pytest
+
+from alerts import AlertEngine, RuleError, WebhookNotifier
+
+
+def snapshot(cpu=None, disks=(), write_rate=None, containers=()):
+    snap = {
+        'disk_info': {
+            'partitions': [{'mountpoint': mount, 'device': 'sda', 'raw_values': {'percent': percent}}
+                           for mount, percent in disks]
+        },
+        'cgroup_info': {
+            'containers': [{'id': cid, 'runtime': 'docker', 'cpu_percent': 1.0} for cid in containers]
+        }
+    }
+    if cpu is not None:
+        snap['cpu_info'] = {'raw_total_usage': cpu}
+    if write_rate is not None:
+        snap['disk_info']['io_rates'] = {'disk_write_rate': write_rate}
+    return snap
+
+
+def run(engine, snapshots, start=1000, step=2):
+    """Evaluate snapshots at a fixed cadence and return [(time, rule, status)]."""
+    events = []
+    for index, snap in enumerate(snapshots):
+        now = start + index * step
+        events += [(now, e['rule'], e['status']) for e in engine.evaluate(snap, now=now)]
+    return events
+
+
+def test_threshold_waits_for_duration():
+    engine = AlertEngine([{'name': 'HighCPU', 'metric': 'cpu.usage', 'op': '>', 'value': 90, 'for': 4}])
+    events = run(engine, [snapshot(cpu=95)] * 4)
+    assert events == [(1004, 'HighCPU', 'firing')]
+
+
+def test_pending_alert_resets_when_condition_clears():
+    engine = AlertEngine([{'name': 'HighCPU', 'metric': 'cpu.usage', 'op': '>', 'value': 90, 'for': 4}])
+    events = run(engine, [snapshot(cpu=95), snapshot(cpu=50), snapshot(cpu=95), snapshot(cpu=96)])
+    assert events == []
+
+
+def test_hysteresis_uses_clear_level():
+    engine = AlertEngine([{'name': 'HighCPU', 'metric': 'cpu.usage', 'op': '>', 'value': 90, 'clear': 80}])
+    events = run(engine, [snapshot(cpu=95), snapshot(cpu=85), snapshot(cpu=81), snapshot(cpu=79)])
+    assert events == [(1000, 'HighCPU', 'firing'), (1006, 'HighCPU', 'resolved')]
+
+
+def test_firing_alert_is_notified_once():
+    engine = AlertEngine([{'name': 'HighCPU', 'metric': 'cpu.usage', 'value': 90}])
+    events = run(engine, [snapshot(cpu=95), snapshot(cpu=96), snapshot(cpu=97)])
+    assert events == [(1000, 'HighCPU', 'firing')]
+    assert len(engine.active_alerts()['alerts']) == 1
+
+
+def test_label_matching():
+    engine = AlertEngine([{'name': 'Disk', 'metric': 'disk.percent', 'labels': {'mountpoint': '/var*'}, 'value': 50}])
+    events = engine.evaluate(snapshot(disks=[('/var', 60), ('/', 99)]), now=1000)
+    assert [e['labels']['mountpoint'] for e in events] == ['/var']
+
+
+def test_rate_rule_fires_on_stalled_value():
+    engine = AlertEngine([{'name': 'Stalled', 'metric': 'disk.write_rate', 'type': 'rate', 'op': '<', 'value': 0.5}])
+    events = run(engine, [snapshot(write_rate=10)] * 5)
+    assert events == [(1002, 'Stalled', 'firing')]
+
+
+def test_rate_uses_previous_sample():
+    engine = AlertEngine([{'name': 'Growing', 'metric': 'disk.percent', 'type': 'rate', 'op': '>', 'value': 1}])
+    # 10 -> 10 -> 14: the last step is 4 over 2s, i.e. 2/s (not 4 over 4s since the last change)
+    events = run(engine, [snapshot(disks=[('/', 10)]), snapshot(disks=[('/', 10)]), snapshot(disks=[('/', 14)]),
+                          snapshot(disks=[('/', 14)])])
+    assert events == [(1004, 'Growing', 'firing'), (1006, 'Growing', 'resolved')]
+
+
+def test_absent_rule_fires_and_resolves():
+    engine = AlertEngine([{'name': 'Gone', 'metric': 'container.cpu_percent', 'type': 'absent', 'for': 5}])
+    events = run(engine, [snapshot(containers=['c1'])] + [snapshot()] * 3 + [snapshot(containers=['c1'])])
+    assert events == [(1006, 'Gone', 'firing'), (1008, 'Gone', 'resolved')]
+
+
+def test_firing_alert_resolves_when_series_disappears():
+    engine = AlertEngine([{'name': 'Disk', 'metric': 'disk.percent', 'value': 50}], missing_after=10)
+    events = run(engine, [snapshot(disks=[('/mnt', 90)])] + [snapshot(disks=[])] * 6)
+    assert events == [(1000, 'Disk', 'firing'), (1010, 'Disk', 'resolved')]
+    assert engine.active_alerts()['alerts'] == []
+
+
+def test_failed_collection_does_not_resolve_alert():
+    engine = AlertEngine([{'name': 'HighCPU', 'metric': 'cpu.usage', 'value': 90}])
+    # cpu_info came back as {"error": ...} for one tick
+    events = run(engine, [snapshot(cpu=95), snapshot(), snapshot(cpu=95), snapshot(cpu=95)])
+    assert events == [(1000, 'HighCPU', 'firing')]
+    assert len(engine.active_alerts()['alerts']) == 1
+
+
+def test_retired_alert_fires_again_with_same_value():
+    engine = AlertEngine([{'name': 'HighCPU', 'metric': 'cpu.usage', 'value': 90}], missing_after=4)
+    events = run(engine, [snapshot(cpu=95), snapshot(), snapshot(), snapshot(), snapshot(cpu=95)])
+    assert events == [(1000, 'HighCPU', 'firing'), (1004, 'HighCPU', 'resolved'), (1008, 'HighCPU', 'firing')]
+
+
+def test_prune_keeps_firing_absent_alert():
+    engine = AlertEngine([{'name': 'Gone', 'metric': 'container.cpu_percent', 'type': 'absent', 'for': 5}],
+                         stale_after=100)
+    engine._last_prune = 1000
+    events = run(engine, [snapshot(containers=['c1']), snapshot()], step=10)
+    assert events == [(1010, 'Gone', 'firing')]
+    assert engine.evaluate(snapshot(), now=1200) == []
+    assert len(engine.active_alerts()['alerts']) == 1
+    events = engine.evaluate(snapshot(containers=['c1']), now=1202)
+    assert [(e['rule'], e['status']) for e in events] == [('Gone', 'resolved')]
+
+
+def test_prune_forgets_stale_series_and_label_cache():
+    engine = AlertEngine([{'name': 'Busy', 'metric': 'container.cpu_percent', 'value': 90}], stale_after=100)
+    engine._last_prune = 1000
+    engine.evaluate(snapshot(containers=['c1', 'c2']), now=1000)
+    assert len(engine.rules[0]._match_cache) == 2
+    engine.evaluate(snapshot(containers=['c2']), now=1150)
+    assert engine.rules[0]._match_cache.keys() == {(('container', 'c2'), ('runtime', 'docker'))}
+    assert all(labels == (('container', 'c2'), ('runtime', 'docker')) for _, labels in engine._seen)
+
+
+def test_invalid_rules_are_rejected():
+    with pytest.raises(RuleError):
+        AlertEngine([{'name': 'Bad', 'metric': 'cpu.usage', 'op': '~', 'value': 1}])
+    with pytest.raises(RuleError):
+        AlertEngine([{'name': 'Bad', 'metric': 'cpu.usage', 'type': 'nope'}])
+
+
+@pytest.fixture
+def webhook():
+    """Local HTTP stub that fails the first `failures` requests with 500."""
+    state = {'failures': 0, 'requests': 0, 'batches': []}
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers['Content-Length']))
+            state['requests'] += 1
+            if state['failures'] > 0:
+                state['failures'] -= 1
+                self.send_response(500)
+            else:
+                state['batches'].append(json.loads(body)['alerts'])
+                self.send_response(200)
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    server = HTTPServer(('127.0.0.1', 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    state['url'] = f'http://127.0.0.1:{server.server_port}/'
+    yield state
+    server.shutdown()
+    server.server_close()
+
+
+def event(name, status='firing'):
+    return {'fingerprint': f'{name}:cpu.usage:', 'rule': name, 'status': status}
+
+
+def test_notifier_batches_and_deduplicates(webhook):
+    notifier = WebhookNotifier([webhook['url']], batch_interval=0.2, backoff_base=0.01).start()
+    try:
+        notifier.notify([event('A'), event('A'), event('B'), event('A', 'resolved')])
+        deadline = time.time() + 5
+        while not webhook['batches'] and time.time() < deadline:
+            time.sleep(0.05)
+    finally:
+        notifier.stop()
+    assert [(e['rule'], e['status']) for e in webhook['batches'][0]] == [('A', 'firing'), ('B', 'firing'), ('A', 'resolved')]
+
+
+def test_notifier_retries_with_backoff(webhook, monkeypatch):
+    webhook['failures'] = 2
+    notifier = WebhookNotifier([webhook['url']], max_retries=3, backoff_base=0.5)
+    delays = []
+    monkeypatch.setattr(notifier._stop, 'wait', lambda delay: delays.append(delay) or False)
+    assert notifier.deliver(webhook['url'], [event('A')])
+    assert delays == [0.5, 1.0]
+    assert webhook['requests'] == 3
+    assert notifier.stats['sent'] == 1
+
+
+def test_notifier_gives_up_after_max_retries(webhook, monkeypatch):
+    webhook['failures'] = 10
+    notifier = WebhookNotifier([webhook['url']], max_retries=2, backoff_base=0.01)
+    monkeypatch.setattr(notifier._stop, 'wait', lambda delay: False)
+    assert not notifier.deliver(webhook['url'], [event('A')])
+    assert webhook['requests'] == 3
+    assert notifier.stats['failed'] == 1
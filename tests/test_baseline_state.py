@@ -0,0 +1,76 @@
+import json
+import time
+from types import SimpleNamespace
+
+import psutil
+import pytest
+
+import app
+
+
+@pytest.fixture
+def state(tmp_path, monkeypatch):
+    """Point STATE_FILE at a temporary file and start from empty baselines."""
+    path = tmp_path / 'state.json'
+    monkeypatch.setattr(app, 'STATE_FILE', str(path))
+    monkeypatch.setattr(app, 'read_boot_id', lambda: 'boot-1')
+    for name in ('last_disk_io', 'last_network_io', 'last_check_time', 'last_cpu_times',
+                 'on_demand_cpu_times', 'static_host_facts'):
+        monkeypatch.setattr(app, name, None)
+    return path
+
+
+def save_current_counters():
+    app.last_check_time = time.time()
+    app.last_disk_io = psutil.disk_io_counters()
+    app.last_network_io = psutil.net_io_counters()
+    app.last_cpu_times = psutil.cpu_times(percpu=True)
+    app.save_baseline_state()
+    saved = (app.last_check_time, app.last_disk_io, app.last_network_io)
+    app.last_check_time = app.last_disk_io = app.last_network_io = app.last_cpu_times = None
+    return saved
+
+
+def test_round_trip_restores_counters(state):
+    if psutil.disk_io_counters() is None:
+        pytest.skip('no disk counters on this host')
+    saved_at, disk_io, network_io = save_current_counters()
+    assert app.load_baseline_state() is True
+    assert app.last_check_time == saved_at
+    assert app.last_disk_io.read_bytes == disk_io.read_bytes
+    assert app.last_network_io.bytes_recv == network_io.bytes_recv
+    assert isinstance(app.last_cpu_times[0], SimpleNamespace)
+
+
+def test_state_from_another_boot_is_ignored(state, monkeypatch):
+    save_current_counters()
+    monkeypatch.setattr(app, 'read_boot_id', lambda: 'boot-2')
+    assert app.load_baseline_state() is False
+    assert app.last_check_time is None
+
+
+def test_state_older_than_max_age_is_ignored(state, monkeypatch):
+    save_current_counters()
+    monkeypatch.setattr(app, 'STATE_MAX_AGE', 0)
+    time.sleep(0.01)
+    assert app.load_baseline_state() is False
+    assert app.last_check_time is None
+
+
+def test_state_without_io_counters_is_not_restored(state):
+    state.write_text(json.dumps({'boot_id': 'boot-1', 'saved_at': time.time(), 'disk_io': None,
+                                 'network_io': None, 'cpu_times': None, 'host': None}))
+    assert app.load_baseline_state() is False
+    assert app.last_check_time is None
+
+
+def test_restored_cpu_times_feed_cpu_usage(state, monkeypatch):
+    save_current_counters()
+    app.load_baseline_state()
+    assert isinstance(app.last_cpu_times[0], SimpleNamespace)
+    # A usable baseline means no blocking fallback sample
+    monkeypatch.setattr(psutil, 'cpu_percent', lambda **kwargs: pytest.fail('fell back to sampling'))
+    time.sleep(0.1)
+    per_core, total = app.calculate_cpu_usage()
+    assert len(per_core) == psutil.cpu_count()
+    assert all(0 <= usage <= 100 for usage in per_core) and 0 <= total <= 100
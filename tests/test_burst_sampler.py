@@ -0,0 +1,106 @@
+import random
+import statistics
+
+import pytest
+
+from burst_sampler import SECTOR_SIZE, BurstSampler, WindowAggregate
+
+
+def true_p95(values):
+    return statistics.quantiles(values, n=20, method='inclusive')[18]
+
+
+@pytest.mark.parametrize('count', [2, 6, 20, 40, 200])
+def test_p95_is_exact_for_window_sized_samples(count):
+    rng = random.Random(count)
+    for _ in range(50):
+        values = [rng.expovariate(1.0) for _ in range(count)]
+        aggregate = WindowAggregate()
+        for value in values:
+            aggregate.add(value)
+        assert aggregate.percentile() == pytest.approx(true_p95(values))
+
+
+def test_p95_falls_back_to_streaming_estimate_past_capacity():
+    rng = random.Random(1)
+    values = [rng.expovariate(1.0) for _ in range(20000)]
+    aggregate = WindowAggregate(capacity=256)
+    for value in values:
+        aggregate.add(value)
+    assert aggregate.percentile() == pytest.approx(true_p95(values), rel=0.05)
+    assert aggregate.summary()['samples'] == 20000
+
+
+def test_summary_and_reset():
+    aggregate = WindowAggregate(capacity=4)
+    for value in (4, 1, 3):
+        aggregate.add(value)
+    assert aggregate.summary() == {'min': 1, 'max': 4, 'mean': 2.67, 'p95': 3.9, 'samples': 3}
+    aggregate.reset()
+    assert aggregate.summary()['samples'] == 0
+    aggregate.add(7)
+    assert aggregate.percentile() == 7
+
+
+def write_proc(root, cpu=(100, 0, 50, 800, 50, 0, 0, 0), sectors=(10, 20), net=(1000, 2000)):
+    (root / 'net').mkdir(parents=True, exist_ok=True)
+    (root / 'stat').write_text('cpu  ' + ' '.join(map(str, cpu)) + ' 0 0\ncpu0 1 2 3 4 5 6 7 8 0 0\n')
+    (root / 'meminfo').write_text('MemTotal:       1000 kB\nMemFree:         100 kB\nMemAvailable:    250 kB\n')
+    read, written = sectors
+    (root / 'diskstats').write_text(
+        f'   8       0 sda 1 0 {read} 0 1 0 {written} 0 0 0 0\n'
+        f'   8       1 sda1 1 0 {read} 0 1 0 {written} 0 0 0 0\n'
+        f'   7       0 loop0 1 0 999 0 1 0 999 0 0 0 0\n'
+    )
+    recv, sent = net
+    (root / 'net' / 'dev').write_text(
+        'Inter-|   Receive                            |  Transmit\n'
+        ' face |bytes    packets errs drop fifo frame compressed multicast|bytes    packets\n'
+        '    lo: 5555 1 0 0 0 0 0 0 5555 1 0 0 0 0 0 0\n'
+        f'  eth0: {recv} 1 0 0 0 0 0 0 {sent} 1 0 0 0 0 0 0\n'
+    )
+
+
+@pytest.fixture
+def sampler(tmp_path):
+    proc = tmp_path / 'proc'
+    write_proc(proc)
+    for disk in ('sda', 'loop0'):
+        (tmp_path / 'sys' / 'block' / disk).mkdir(parents=True)
+    sampler = BurstSampler(proc_root=str(proc), sys_root=str(tmp_path / 'sys'))
+    yield sampler
+    sampler.stop()
+
+
+def test_read_counters_from_fake_proc(sampler):
+    counters = sampler._read_counters()
+    assert counters['cpu_total'] == 1000 and counters['cpu_idle'] == 850
+    assert counters['mem_percent'] == 75.0
+    # Partitions and loop devices are not counted
+    assert counters['disk_read'] == 10 * SECTOR_SIZE and counters['disk_write'] == 20 * SECTOR_SIZE
+    assert counters['net_recv'] == 1000 and counters['net_sent'] == 2000
+
+
+def test_roll_closes_and_resets_window(sampler, tmp_path):
+    sampler.sample()
+    write_proc(tmp_path / 'proc', cpu=(200, 0, 100, 850, 50, 0, 0, 0), sectors=(30, 20), net=(3000, 2000))
+    sampler.sample()
+    window = sampler.roll()
+    assert window['cpu']['usage']['samples'] == 1
+    assert window['cpu']['usage']['mean'] == 75.0
+    assert window['disk']['read_rate']['samples'] == 1
+    assert sampler.last_window() is window
+    assert sampler.roll()['cpu']['usage']['samples'] == 0
+
+
+def test_rates_clamp_when_counters_go_backwards(sampler):
+    previous = {'cpu_total': 100, 'cpu_idle': 50, 'disk_read': 5000, 'disk_write': 5000,
+                'net_recv': 5000, 'net_sent': 5000}
+    current = {'cpu_total': 200, 'cpu_idle': 100, 'disk_read': 1000, 'disk_write': 7000,
+               'net_recv': 0, 'net_sent': 5000}
+    sampler._fold(previous, current, 2.0)
+    window = sampler.roll()
+    assert window['disk']['read_rate']['max'] == 0
+    assert window['disk']['write_rate']['max'] == 1000
+    assert window['network']['download_rate']['max'] == 0
+    assert window['cpu']['usage']['max'] == 50.0
@@ -0,0 +1,121 @@
+import cgroups
+from cgroups import CgroupCollector, container_for
+
+CONTAINER_ID = 'ab' * 32
+
+
+def write_cgroup(directory, usage_usec=0, rbytes=0, wbytes=0, **files):
+    directory.mkdir(parents=True, exist_ok=True)
+    (directory / 'cpu.stat').write_text(f'usage_usec {usage_usec}\nuser_usec 0\nsystem_usec 0\n'
+                                        f'nr_throttled 3\nthrottled_usec 0\n')
+    (directory / 'io.stat').write_text(f'8:0 rbytes={rbytes} wbytes={wbytes} rios=1 wios=1\n')
+    for name, content in files.items():
+        (directory / name.replace('_', '.', 1)).write_text(content)
+
+
+def fake_tree(root):
+    (root / 'cgroup.controllers').write_text('cpu io memory pids\n')
+    write_cgroup(root)
+    write_cgroup(root / 'system.slice' / 'cron.service', memory_current='1024\n')
+    write_cgroup(root / 'system.slice' / f'docker-{CONTAINER_ID}.scope',
+                 memory_current='268435456\n', memory_max='536870912\n', pids_current='4\n',
+                 pids_max='max\n', cpu_max='150000 100000\n', memory_stat='anon 100\nfile 200\nslab 7\n')
+    return root / 'system.slice' / f'docker-{CONTAINER_ID}.scope'
+
+
+class Clock:
+    """Stand-in for time.monotonic that only moves when told to."""
+
+    def __init__(self, now=100.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def test_container_detection():
+    assert container_for(f'system.slice/docker-{CONTAINER_ID}.scope') == ('docker', CONTAINER_ID)
+    assert container_for(f'kubepods.slice/cri-containerd-{CONTAINER_ID}.scope') == ('containerd', CONTAINER_ID)
+    assert container_for(f'machine.slice/libpod-{CONTAINER_ID}.scope') == ('podman', CONTAINER_ID)
+    assert container_for('system.slice/cron.service') is None
+
+
+def test_unavailable_without_cgroup_v2(tmp_path):
+    assert CgroupCollector(str(tmp_path)).collect() == {'available': False, 'root': str(tmp_path)}
+
+
+def test_limits_and_rates_across_collects(tmp_path, monkeypatch):
+    container = fake_tree(tmp_path)
+    clock = Clock()
+    monkeypatch.setattr(cgroups.time, 'monotonic', clock)
+    collector = CgroupCollector(str(tmp_path), rescan_interval=60)
+
+    first = collector.collect()
+    assert first['available'] and first['cgroup_count'] == 4
+    [entry] = first['containers']
+    assert entry['runtime'] == 'docker' and entry['id'] == CONTAINER_ID[:12]
+    assert entry['memory_limit_bytes'] == 536870912 and entry['memory_percent'] == 50.0
+    assert entry['pids_limit'] is None and entry['cpu_limit_cores'] == 1.5
+    assert entry['memory_stat'] == {'anon': 100, 'file': 200}
+    assert entry['cpu_percent'] == 0.0 and entry['io_write_rate'] == 0.0
+
+    # One second of CPU and 4 KiB written over the 2s between ticks
+    write_cgroup(container, usage_usec=1000000, wbytes=4096)
+    clock.now += 2
+    second = collector.collect()
+    [entry] = second['containers']
+    assert entry['cpu_percent'] == 50.0
+    assert entry['io_write_rate'] == 2048 and entry['io_read_rate'] == 0
+    assert second['cgroups'][0]['path'] == f'/system.slice/docker-{CONTAINER_ID}.scope'
+
+
+def test_latest_does_not_advance_rate_window(tmp_path, monkeypatch):
+    container = fake_tree(tmp_path)
+    clock = Clock()
+    monkeypatch.setattr(cgroups.time, 'monotonic', clock)
+    collector = CgroupCollector(str(tmp_path))
+
+    collector.collect()
+    write_cgroup(container, usage_usec=1000000)
+    clock.now += 2
+    assert collector.latest()['containers'][0]['cpu_percent'] == 0.0
+    tick = collector.collect()
+    assert collector.latest() is tick
+    assert tick['containers'][0]['cpu_percent'] == 50.0
+
+
+def test_removed_cgroups_are_dropped(tmp_path, monkeypatch):
+    container = fake_tree(tmp_path)
+    monkeypatch.setattr(cgroups.time, 'monotonic', Clock())
+    collector = CgroupCollector(str(tmp_path), rescan_interval=60)
+    collector.collect()
+    for path in container.iterdir():
+        path.unlink()
+    container.rmdir()
+    result = collector.collect()
+    assert result['cgroup_count'] == 3 and result['containers'] == []
+
+
+def test_containers_are_capped_and_listed_in_full(tmp_path, monkeypatch):
+    fake_tree(tmp_path)
+    for index in range(5):
+        write_cgroup(tmp_path / 'system.slice' / f'docker-{index:064x}.scope', usage_usec=index)
+    monkeypatch.setattr(cgroups.time, 'monotonic', Clock())
+    collector = CgroupCollector(str(tmp_path), top_containers=2)
+    result = collector.collect()
+    assert result['container_count'] == 6 and len(result['containers']) == 2
+    assert len(collector.latest(full=True)['containers']) == 6
+    assert collector.latest() is result
+
+
+def test_limits_are_read_once_per_rescan(tmp_path, monkeypatch):
+    container = fake_tree(tmp_path)
+    clock = Clock()
+    monkeypatch.setattr(cgroups.time, 'monotonic', clock)
+    collector = CgroupCollector(str(tmp_path), rescan_interval=60)
+    collector.collect()
+    (container / 'memory.max').write_text('1073741824\n')
+    clock.now += 2
+    assert collector.collect()['containers'][0]['memory_limit_bytes'] == 536870912
+    clock.now += 60
+    assert collector.collect()['containers'][0]['memory_limit_bytes'] == 1073741824
@@ -0,0 +1,90 @@
+import threading
+import time
+
+from client_streams import ClientStreamManager
+
+
+class Emitter:
+    """Records emits and acknowledges each batch immediately."""
+
+    def __init__(self):
+        self.frames = []
+        self.sent = threading.Event()
+
+    def __call__(self, topic, payload, to=None, callback=None):
+        self.frames.append((topic, payload))
+        self.sent.set()
+        if callback:
+            callback()
+
+
+def test_deferred_frame_is_sent_by_timer():
+    emit = Emitter()
+    streams = ClientStreamManager(emit, ['cpu_info'], min_interval=0.2)
+    streams.add('sid')
+    streams.publish({'cpu_info': 1})
+    assert emit.frames == [('cpu_info', 1)]
+
+    # Inside the client's interval: held back, then flushed from the timer thread
+    emit.sent.clear()
+    streams.publish({'cpu_info': 2})
+    streams.publish({'cpu_info': 3})
+    assert emit.sent.wait(2)
+    assert emit.frames == [('cpu_info', 1), ('cpu_info', 3)]
+    assert streams.stats()['frames_dropped'] == 1
+
+
+def test_timer_reschedules_when_flush_is_still_early():
+    emit = Emitter()
+    streams = ClientStreamManager(emit, ['cpu_info'], min_interval=0.3)
+    streams.add('sid')
+    streams.publish({'cpu_info': 1})
+    emit.sent.clear()
+    streams.publish({'cpu_info': 2})
+    # Let the timer fire while the interval has not fully passed yet
+    streams._clients['sid'].interval = 0.6
+    assert emit.sent.wait(3)
+    assert emit.frames[-1] == ('cpu_info', 2)
+    assert time.monotonic() - streams._clients['sid'].last_sent < 1
+
+
+class HeldAcks:
+    """Records emits and keeps the ack callbacks for the test to call."""
+
+    def __init__(self):
+        self.callbacks = []
+
+    def __call__(self, topic, payload, to=None, callback=None):
+        if callback:
+            self.callbacks.append(callback)
+
+
+def test_late_ack_after_timeout_is_ignored():
+    emit = HeldAcks()
+    streams = ClientStreamManager(emit, ['cpu_info'], ack_timeout=0.05, max_interval=0.05)
+    streams.add('sid')
+    streams.publish({'cpu_info': 1})
+    time.sleep(0.1)
+    # No ack within the timeout: the next publish gives up on the first batch
+    streams.publish({'cpu_info': 2})
+    deadline = time.monotonic() + 2
+    while len(emit.callbacks) < 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    client = streams._clients['sid']
+    assert len(emit.callbacks) == 2 and client.ack_timeouts == 1
+
+    emit.callbacks[0]()
+    assert client.in_flight and client.rtt is None
+    emit.callbacks[1]()
+    assert not client.in_flight and client.rtt is not None
+
+
+def test_totals_survive_disconnects():
+    emit = Emitter()
+    streams = ClientStreamManager(emit, ['cpu_info', 'timestamp'])
+    streams.add('a')
+    streams.add('b')
+    streams.publish({'cpu_info': 1, 'timestamp': 1})
+    assert streams.stats()['frames_sent'] == 4
+    streams.remove('a')
+    assert streams.stats()['frames_sent'] == 4
@@ -0,0 +1,93 @@
+import gzip
+import os
+
+from recorder import RecordingReader, RecordingWriter, diff, index_path, patch
+
+
+def snapshot(i):
+    return {'cpu_info': {'raw_total_usage': i % 7, 'cores': [i % 3] * 4}, 'host': {'name': 'web-1'},
+            'timestamp': {'time': str(i)}}
+
+
+def record(path, start, stop, keyframe_interval=10):
+    writer = RecordingWriter(str(path), keyframe_interval=keyframe_interval)
+    for i in range(start, stop):
+        writer.append(snapshot(i), timestamp=1000 + i)
+    return writer
+
+
+def timestamps(path, **kwargs):
+    return [t for t, _ in RecordingReader(str(path)).records(**kwargs)]
+
+
+def test_diff_and_patch_roundtrip():
+    old = {'a': 1, 'b': {'c': 2, 'd': 3}, 'gone': True}
+    new = {'a': 1, 'b': {'c': 5, 'd': 3}, 'e': [1]}
+    delta = diff(old, new)
+    assert delta == {'b': {'c': 5}, 'e': [1], '$del': ['gone']}
+    assert patch(old, delta) == new
+
+
+def test_roundtrip_seek_and_zcat(tmp_path):
+    path = tmp_path / 'rec.ndjson.gz'
+    record(path, 0, 25).close()
+    reader = RecordingReader(str(path))
+    assert reader.keyframes()[0] == [1000, 1010, 1020]
+    assert [snap for _, snap in reader.records()] == [snapshot(i) for i in range(25)]
+    assert timestamps(path, start=1013, end=1015) == [1013, 1014, 1015]
+    assert reader.time_range() == (1000, 1024)
+    with gzip.open(path) as f:
+        assert len(f.read().splitlines()) == 25
+
+
+def test_records_are_readable_while_segment_is_open(tmp_path):
+    path = tmp_path / 'rec.ndjson.gz'
+    writer = record(path, 0, 5)
+    try:
+        assert timestamps(path) == [1000, 1001, 1002, 1003, 1004]
+    finally:
+        writer.close()
+
+
+def test_one_member_per_keyframe_segment_compresses(tmp_path):
+    path = tmp_path / 'rec.ndjson.gz'
+    record(path, 0, 30, keyframe_interval=30).close()
+    # A single member: every delta compresses against the ones before it
+    with open(path, 'rb') as f:
+        assert f.read().count(b'\x1f\x8b\x08') == 1
+
+
+def test_writer_recovers_torn_segment(tmp_path):
+    path = tmp_path / 'rec.ndjson.gz'
+    writer = record(path, 0, 15)
+    writer._file.flush()
+    # Crash: the last record is half written and garbage follows
+    with open(path, 'r+b') as f:
+        f.truncate(os.path.getsize(path) - 20)
+    with open(path, 'ab') as f:
+        f.write(b'\0' * 64)
+
+    record(path, 20, 25).close()
+    times = timestamps(path)
+    assert times[:14] == list(range(1000, 1014))
+    assert times[-5:] == list(range(1020, 1025))
+    assert RecordingReader(str(path)).keyframes()[0] == [1000, 1010, 1020]
+    with gzip.open(path) as f:
+        assert len(f.read().splitlines()) == len(times)
+
+
+def test_reader_resyncs_at_next_keyframe(tmp_path):
+    path = tmp_path / 'rec.ndjson.gz'
+    record(path, 0, 30).close()
+    offsets = RecordingReader(str(path)).keyframes()[1]
+    data = bytearray(path.read_bytes())
+    data[offsets[1] + 40] ^= 0xff
+    path.write_bytes(bytes(data))
+    assert timestamps(path) == list(range(1000, 1010)) + list(range(1020, 1030))
+
+
+def test_index_is_rebuilt_when_missing(tmp_path):
+    path = tmp_path / 'rec.ndjson.gz'
+    record(path, 0, 25).close()
+    os.remove(index_path(str(path)))
+    assert RecordingReader(str(path)).keyframes()[0] == [1000, 1010, 1020]
@@ -0,0 +1,65 @@
+import os
+import subprocess
+import sys
+import uuid
+
+import pytest
+
+from snapshot_store import SnapshotReader, SnapshotWriter
+
+APP_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'app')
+
+
+@pytest.fixture
+def name():
+    return f'test_snapshot_{uuid.uuid4().hex[:8]}'
+
+
+def test_read_decodes_once_per_generation(name):
+    writer = SnapshotWriter(name, slot_size=4096)
+    reader = SnapshotReader(name)
+    try:
+        assert reader.read() == (0, None)
+        writer.publish({'cpu_info': {'usage': 1}})
+        generation, first = reader.read()
+        assert generation == 1 and first == {'cpu_info': {'usage': 1}}
+        assert reader.read()[1] is first
+        writer.publish({'cpu_info': {'usage': 2}})
+        assert reader.read() == (2, {'cpu_info': {'usage': 2}})
+    finally:
+        reader.close()
+        writer.close()
+
+
+def test_reader_follows_restarted_writer(name):
+    writer = SnapshotWriter(name, slot_size=4096)
+    reader = SnapshotReader(name, recheck_interval=0)
+    try:
+        writer.publish({'a': 1})
+        assert reader.read() == (1, {'a': 1})
+        writer.close()
+        writer = SnapshotWriter(name, slot_size=4096)
+        writer.publish({'a': 2})
+        assert reader.read() == (1, {'a': 2})
+    finally:
+        reader.close()
+        writer.close()
+
+
+def test_writer_refuses_segment_of_running_collector(name):
+    script = (f"import sys, time; sys.path.insert(0, {APP_DIR!r})\n"
+              f"from snapshot_store import SnapshotWriter\n"
+              f"writer = SnapshotWriter({name!r}, slot_size=4096)\n"
+              f"print('ready', flush=True)\n"
+              f"time.sleep(30)\n")
+    owner = subprocess.Popen([sys.executable, '-c', script], stdout=subprocess.PIPE, universal_newlines=True)
+    try:
+        assert owner.stdout.readline().strip() == 'ready'
+        with pytest.raises(RuntimeError, match='running collector'):
+            SnapshotWriter(name, slot_size=4096, takeover_timeout=0.2)
+    finally:
+        owner.kill()
+        owner.wait()
+    # Once the owner is gone its segment is stale and can be taken over
+    writer = SnapshotWriter(name, slot_size=4096)
+    writer.close()